@@ -0,0 +1,131 @@
+import math
+from collections import OrderedDict
+import pygame
+
+# Card animations from precomputed frame tables. A table is built once per
+# note and card size and every animated frame is then a single blit:
+#   flip   the back squashes to nothing, then the face widens out of the card's
+#          centre (growing to the face size when faces are larger than cards)
+#   unflip the flip table played backwards
+#   match  the face swells by `pulse` and settles back
+# Frames are (surface, (dx, dy)) with the offset from the card's top-left.
+class FrameTables:
+    def __init__(self, back_color, steps=5, pulse=0.15, max_tables=96):
+        self.back_color = back_color
+        self.backs = {}  # card size -> plain card back
+        self.steps = steps
+        self.pulse = pulse
+        self.max_tables = max_tables
+        self.tables = OrderedDict()  # (kind, note, back size, face size) -> frames
+        self.builds = 0
+
+    def get(self, key, build):
+        frames = self.tables.get(key)
+        if frames is None:
+            frames = self.tables[key] = build()
+            self.builds += 1
+            while len(self.tables) > self.max_tables:
+                self.tables.popitem(last=False)
+        else:
+            self.tables.move_to_end(key)
+        return frames
+
+    def centred(self, image, card_size):
+        return image, ((card_size[0] - image.get_width()) // 2, (card_size[1] - image.get_height()) // 2)
+
+    def scaled(self, image, size, card_size):
+        size = (max(1, size[0]), max(1, size[1]))
+        if size != image.get_size():
+            image = pygame.transform.smoothscale(image, size)
+        return self.centred(image, card_size)
+
+    def back(self, size):
+        # Backs are plain fills, so every squashed width is shared by all notes
+        back = self.backs.get(size)
+        if back is None:
+            back = pygame.Surface(size)
+            if pygame.display.get_surface():
+                back = back.convert()
+            back.fill(self.back_color)
+            self.backs[size] = back
+        return back
+
+    def flip(self, note, face, card_size):
+        face_size = face.get_size()
+        key = ('flip', note, card_size, face_size)
+
+        def build():
+            frames = []
+            for i in range(self.steps):
+                f = (self.steps - i) / self.steps
+                frames.append(self.centred(self.back((max(1, round(card_size[0] * f)), card_size[1])), card_size))
+            for i in range(1, self.steps + 1):
+                f = i / self.steps
+                height = round(card_size[1] + (face_size[1] - card_size[1]) * f)
+                frames.append(self.scaled(face, (round(face_size[0] * f), height), card_size))
+            return frames
+        return self.get(key, build)
+
+    def unflip(self, note, face, card_size):
+        return self.flip(note, face, card_size)[::-1]
+
+    def match(self, note, face, card_size):
+        key = ('match', note, card_size, face.get_size())
+
+        def build():
+            frames = []
+            for i in range(1, self.steps * 2):
+                scale = 1 + self.pulse * math.sin(math.pi * i / (self.steps * 2))
+                frames.append(self.scaled(face, (round(face.get_width() * scale), round(face.get_height() * scale)),
+                                          card_size))
+            frames.append(self.centred(face, card_size))
+            return frames
+        return self.get(key, build)
+
+    def prepare(self, notes, face_for, card_size):
+        # Build the flip and match tables of a new game's notes before its first click
+        for note in notes:
+            face = face_for(note)
+            self.flip(note, face, card_size)
+            self.match(note, face, card_size)
+
+# Cards currently animating, each stepping through its frames on the game
+# clock (`frame_ms` per frame, so a busy frame skips ahead rather than slowing
+# the animation down). Any number of cards can run at once.
+class CardAnimations:
+    def __init__(self, clock, frame_ms=25):
+        self.clock = clock
+        self.frame_ms = frame_ms
+        self.running = {}  # idx -> (start, frames, bounds relative to the card)
+
+    def start(self, idx, frames):
+        bounds = pygame.Rect(frames[0][1], frames[0][0].get_size()).unionall(
+            [pygame.Rect(offset, image.get_size()) for image, offset in frames[1:]])
+        old = self.running.get(idx)
+        if old is not None:
+            bounds.union_ip(old[2])  # Cover whatever the interrupted animation last drew
+        self.running[idx] = (self.clock(), frames, bounds)
+
+    def frame(self, idx):
+        entry = self.running.get(idx)
+        if entry is None:
+            return None
+        start, frames, _ = entry
+        return frames[min(len(frames) - 1, (self.clock() - start) // self.frame_ms)]
+
+    def advance(self):
+        # (idx, bounds) of every card to repaint this frame; finished animations are dropped
+        # here, so their last repaint shows the card at rest
+        now = self.clock()
+        changed = []
+        for idx, (start, frames, bounds) in list(self.running.items()):
+            changed.append((idx, bounds))
+            if now - start >= len(frames) * self.frame_ms:
+                del self.running[idx]
+        return changed
+
+    def clear(self):
+        self.running = {}
+
+    def is_idle(self):
+        return not self.running
@@ -0,0 +1,141 @@
+import atexit
+import os
+import time
+from collections import deque
+import pygame
+
+# Mixer set-up and voice management. The mixer is pre-initialised with a small
+# buffer (TRUC_XANH_AUDIO_BUFFER, _FREQUENCY and _CHANNELS override the
+# defaults) and the first channels are reserved as the pool card notes play
+# on, so pygame never picks a channel on its own.
+DEFAULT_BUFFER = 512
+DEFAULT_FREQUENCY = 44100
+DEFAULT_CHANNELS = 2
+
+def mixer_settings():
+    return {
+        'frequency': int(os.environ.get('TRUC_XANH_AUDIO_FREQUENCY', DEFAULT_FREQUENCY)),
+        'size': -16,
+        'channels': int(os.environ.get('TRUC_XANH_AUDIO_CHANNELS', DEFAULT_CHANNELS)),
+        'buffer': int(os.environ.get('TRUC_XANH_AUDIO_BUFFER', DEFAULT_BUFFER))
+    }
+
+# A fixed set of mixer channels. play() restarts the voice already playing the
+# same sound, otherwise takes a free voice, otherwise applies the steal policy:
+# 'oldest' cuts the voice that started first, 'drop' skips the new sound.
+class ChannelPool:
+    def __init__(self, first, count, steal='oldest'):
+        if steal not in ('oldest', 'drop'):
+            raise ValueError(f"Unknown voice stealing policy {steal!r}")
+        self.channels = [pygame.mixer.Channel(i) for i in range(first, first + count)]
+        self.steal = steal
+        self.sounds = [None] * count
+        self.started = [0.0] * count
+        self.plays = 0
+        self.steals = 0
+        self.drops = 0
+
+    def voice_for(self, sound):
+        free = None
+        for i, channel in enumerate(self.channels):
+            busy = channel.get_busy()
+            if busy and self.sounds[i] is sound:
+                return i
+            if not busy and free is None:
+                free = i
+        if free is not None:
+            return free
+        if self.steal == 'drop':
+            return None
+        self.steals += 1
+        return min(range(len(self.channels)), key=self.started.__getitem__)
+
+    def play(self, sound):
+        i = self.voice_for(sound)
+        if i is None:
+            self.drops += 1
+            return None
+        self.channels[i].play(sound)
+        self.sounds[i] = sound
+        self.started[i] = time.perf_counter()
+        self.plays += 1
+        return self.channels[i]
+
+    def stats(self):
+        return {'voices': len(self.channels), 'plays': self.plays, 'steals': self.steals, 'drops': self.drops}
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, len(sorted_values) * p // 100)] if sorted_values else 0.0
+
+# Time from taking a MOUSEBUTTONDOWN off the queue to the play() call it caused.
+# The mixer buffer adds buffer / frequency on top of this before the note is heard.
+# A click that plays nothing in its own frame (a rejected flip, or one sent to
+# the server) is dropped by frame(), so a later note is never timed against it.
+class LatencyMeter:
+    def __init__(self, history=500):
+        self.samples = deque(maxlen=history)
+        self.pending = None
+
+    def click(self):
+        self.pending = time.perf_counter()
+
+    def played(self):
+        if self.pending is not None:
+            self.samples.append((time.perf_counter() - self.pending) * 1000)
+            self.pending = None
+
+    def frame(self):
+        self.pending = None
+
+    def stats(self):
+        values = sorted(self.samples)
+        return {'samples': len(values), 'p50_ms': percentile(values, 50), 'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99), 'max_ms': values[-1] if values else 0.0}
+
+class AudioOutput:
+    def __init__(self, note_voices=8, steal='oldest'):
+        self.note_voices = note_voices
+        self.steal = steal
+        self.notes = None
+        self.settings = None
+        self.latency = LatencyMeter()
+        if os.environ.get('TRUC_XANH_AUDIO_STATS'):
+            atexit.register(lambda: print(self.report()))
+
+    def init(self, settings=None):
+        # Raises pygame.error like pygame.mixer.init when there is no audio device
+        self.settings = settings or mixer_settings()
+        pygame.mixer.pre_init(**self.settings)
+        pygame.mixer.init()
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), self.note_voices))
+        pygame.mixer.set_reserved(self.note_voices)
+        self.notes = ChannelPool(0, self.note_voices, self.steal)
+
+    def play_note(self, sound):
+        self.latency.played()
+        if sound is None:
+            return None  # No mixer, so no sound could be made
+        return self.notes.play(sound) if self.notes else sound.play()
+
+    def buffer_ms(self):
+        initialised = pygame.mixer.get_init()
+        return 1000.0 * self.settings['buffer'] / initialised[0] if initialised and self.settings else 0.0
+
+    def stats(self):
+        return {
+            'latency': self.latency.stats(),
+            'buffer_ms': self.buffer_ms(),
+            'notes': self.notes.stats() if self.notes else None
+        }
+
+    def report(self):
+        stats = self.stats()
+        latency = stats['latency']
+        lines = [f"Click to play: p50 {latency['p50_ms']:.2f} ms, p95 {latency['p95_ms']:.2f} ms, "
+                 f"p99 {latency['p99_ms']:.2f} ms over {latency['samples']} notes "
+                 f"(+{stats['buffer_ms']:.1f} ms mixer buffer)"]
+        if stats['notes']:
+            lines.append(f"notes voices: {stats['notes']}")
+        return "\n".join(lines)
+
+audio = AudioOutput()
@@ -0,0 +1,132 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+# Headless benchmarks for the three game modules. Each module is measured in
+# its own subprocess (importing one initialises pygame and opens the window),
+# results are written as JSON and can be compared against a saved baseline:
+#   python benchmark.py --output bench.json
+#   python benchmark.py --baseline bench.json
+MODULES = ['main', 'main_2', 'main_5']
+GRID_SIZES = {'main': [30, 50], 'main_2': [20, 40], 'main_5': [20, 40]}
+
+def timings(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'mean_ms': statistics.fmean(samples), 'p50_ms': statistics.median(samples),
+            'min_ms': min(samples), 'runs': repeat}
+
+def run_module(name, repeat):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    results = {}
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    results['import'] = {'mean_ms': (time.perf_counter() - start) * 1000, 'runs': 1}
+    game = module.game
+
+    game.state = 'menu'
+    results['draw_menu'] = timings(game.draw, repeat)
+    for grid_size in GRID_SIZES[name]:
+        results[f'setup_game_{grid_size}'] = timings(lambda: game.setup_game('multi', grid_size), repeat)
+    results['draw_playing'] = timings(game.draw, repeat)
+
+    def draw_card_change():
+        # One card turning over per frame, the usual change while playing
+        board = game.board
+        board.unflip(0) if board.is_flipped(0) else board.flip(0)
+        game.draw()
+    results['draw_card_change'] = timings(draw_card_change, repeat)
+    game.state = 'game_over'
+    results['draw_game_over'] = timings(game.draw, repeat)
+
+    # Random clicks on card centres (the window also has Exit buttons that call pygame.quit),
+    # skipping the mismatch delay and restarting whenever a game ends
+    game.setup_game('multi', GRID_SIZES[name][-1])
+    rng = random.Random(1)
+    centres = []
+    for idx in range(len(game.board.notes)):
+        x, y, w, h = game.card_index.card_rect(idx)
+        centres.append((x + w // 2, y + h // 2))
+    clicks = [rng.choice(centres) for _ in range(repeat * 20)]
+    start = time.perf_counter()
+    for pos in clicks:
+        game.handle_click(pos)
+        if game.waiting:
+            game.end_wait()  # Resolve the mismatch right away
+        if game.state != 'playing':
+            game.setup_game('multi', GRID_SIZES[name][-1])
+    elapsed = time.perf_counter() - start
+    results['handle_click'] = {'mean_ms': elapsed * 1000 / len(clicks), 'clicks_per_second': len(clicks) / elapsed,
+                               'runs': len(clicks)}
+    return results
+
+def run_all(modules, repeat):
+    report = {}
+    for name in modules:
+        proc = subprocess.run([sys.executable, __file__, '--worker', name, '--repeat', str(repeat)],
+                              capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if proc.returncode != 0:
+            print(f"{name}: benchmark failed\n{proc.stderr}")
+            report[name] = {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}
+            continue
+        report[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+    return report
+
+def compare(report, baseline, tolerance, min_delta):
+    # Returns a list of (module, metric, baseline ms, current ms) that got slower than tolerance allows;
+    # differences below min_delta milliseconds are treated as noise
+    regressions = []
+    for name, metrics in report.items():
+        for metric, result in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not isinstance(result, dict) or not isinstance(old, dict):
+                continue
+            key = 'p50_ms' if 'p50_ms' in result and 'p50_ms' in old else 'mean_ms'
+            if old.get(key) and result[key] > old[key] * (1 + tolerance) and result[key] - old[key] > min_delta:
+                regressions.append((name, metric, old[key], result[key]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks for Truc Xanh Music")
+    parser.add_argument('--modules', nargs='+', choices=MODULES, default=MODULES)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--baseline', help="compare against a previous JSON result")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    parser.add_argument('--min-delta', type=float, default=0.05, help="ignore slowdowns smaller than this many ms")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_module(args.worker, args.repeat)))
+        return
+
+    report = run_all(args.modules, args.repeat)
+    for name, metrics in report.items():
+        for metric, result in metrics.items():
+            if isinstance(result, dict):
+                print(f"{name:>7} {metric:<18} {result['mean_ms']:9.3f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.min_delta)
+        for name, metric, old, new in regressions:
+            print(f"REGRESSION {name} {metric}: {old:.3f} ms -> {new:.3f} ms")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
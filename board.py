@@ -0,0 +1,71 @@
+from array import array
+
+# Compact board state: one note id per position plus a byte of flags, with a
+# note -> positions index and a running matched count so win detection and
+# hint lookups never scan the whole board
+FLIPPED = 1
+MATCHED = 2
+HINT = 4
+
+class Board:
+    def __init__(self, card_notes):
+        self.note_names = list(dict.fromkeys(card_notes))  # note id -> note name
+        note_ids = {name: i for i, name in enumerate(self.note_names)}
+        self.notes = array('I', (note_ids[note] for note in card_notes))
+        self.flags = bytearray(len(self.notes))
+        self.positions = [[] for _ in self.note_names]  # note id -> card positions
+        for idx, note_id in enumerate(self.notes):
+            self.positions[note_id].append(idx)
+        self.matched_count = 0
+
+    def __len__(self):
+        return len(self.notes)
+
+    def note(self, idx):
+        return self.note_names[self.notes[idx]]
+
+    def is_flipped(self, idx):
+        return bool(self.flags[idx] & FLIPPED)
+
+    def is_matched(self, idx):
+        return bool(self.flags[idx] & MATCHED)
+
+    def is_hint(self, idx):
+        return bool(self.flags[idx] & HINT)
+
+    def is_face_up(self, idx):
+        return bool(self.flags[idx])
+
+    def can_flip(self, idx):
+        return not self.flags[idx] & (FLIPPED | MATCHED)
+
+    def flip(self, idx):
+        self.flags[idx] |= FLIPPED
+
+    def unflip(self, idx):
+        self.flags[idx] &= ~FLIPPED
+
+    def set_hint(self, idx, on=True):
+        if on:
+            self.flags[idx] |= HINT
+        else:
+            self.flags[idx] &= ~HINT
+
+    def same_note(self, a, b):
+        return self.notes[a] == self.notes[b]
+
+    def match(self, a, b):
+        for idx in (a, b):
+            if not self.flags[idx] & MATCHED:
+                self.flags[idx] |= MATCHED
+                self.matched_count += 1
+
+    def is_complete(self):
+        return self.matched_count == len(self.notes)
+
+    def partner(self, idx):
+        # Another unmatched card with the same note, or None
+        for other in self.positions[self.notes[idx]]:
+            if other != idx and not self.flags[other] & MATCHED:
+                return other
+        return None
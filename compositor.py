@@ -0,0 +1,103 @@
+import atexit
+import os
+import pygame
+from dirty_rects import merge_rects
+
+# Scene built from cached window-sized layers, composited bottom to top. A
+# layer is only repainted when its key changes (or a part of it is
+# invalidated), and only the changed rects are recomposited onto the screen
+# and handed to the DirtyRenderer, so a frame where nothing changed costs no
+# blits at all. paint(surface, area) draws the layer in window coordinates
+# with the surface clipped to `area`; it may return the rects it drew, which
+# limits what a full repaint marks to the old and new drawn rects instead of
+# the whole window. A key of None hides the layer. With TRUC_XANH_LAYER_STATS
+# set, how often each layer was repainted is printed at exit.
+class Layer:
+    def __init__(self, name, paint, size, alpha):
+        self.name = name
+        self.paint = paint
+        self.alpha = alpha
+        self.surface = pygame.Surface(size, pygame.SRCALPHA if alpha else 0)
+        if pygame.display.get_surface():
+            self.surface = self.surface.convert_alpha() if alpha else self.surface.convert()
+        self.key = None
+        self.visible = False
+        self.full = False  # Repaint everything at the next compose
+        self.dirty = []  # Rects to repaint at the next compose
+        self.drawn = None  # Rects the last full repaint drew, None for the whole layer
+        self.repaints = 0
+        self.partial_repaints = 0
+
+class Compositor:
+    def __init__(self, screen, renderer):
+        self.screen = screen
+        self.renderer = renderer
+        self.rect = screen.get_rect()
+        self.layers = []
+        self.by_name = {}
+        renderer.restore = self.restore
+        if os.environ.get('TRUC_XANH_LAYER_STATS'):
+            atexit.register(lambda: print(self.report()))
+
+    def add(self, name, paint, alpha=True):
+        layer = Layer(name, paint, self.rect.size, alpha)
+        self.layers.append(layer)
+        self.by_name[name] = layer
+        return layer
+
+    def update(self, name, key):
+        # Repaint the whole layer when its key changed since the last compose
+        layer = self.by_name[name]
+        if key != layer.key or (key is not None) != layer.visible:
+            layer.key = key
+            layer.full = True
+
+    def invalidate(self, name, rect):
+        # Repaint part of a layer whose key did not change
+        self.by_name[name].dirty.append(pygame.Rect(rect).clip(self.rect))
+
+    def repaint(self, layer, area):
+        layer.surface.set_clip(area)
+        layer.surface.fill((0, 0, 0, 0) if layer.alpha else (0, 0, 0), area)
+        drawn = layer.paint(layer.surface, area)
+        layer.surface.set_clip(None)
+        return drawn
+
+    def compose(self):
+        changed = []
+        for layer in self.layers:
+            if layer.full:
+                old = layer.drawn if layer.visible else []
+                layer.visible = layer.key is not None
+                drawn = self.repaint(layer, self.rect) if layer.visible else []
+                layer.drawn = drawn
+                changed.extend([self.rect] if old is None or drawn is None else old + drawn)
+                layer.repaints += 1
+            elif layer.dirty and layer.visible:
+                for rect in layer.dirty:
+                    self.repaint(layer, rect)
+                changed.extend(layer.dirty)
+                layer.partial_repaints += 1
+            layer.full = False
+            layer.dirty = []
+        for rect in merge_rects([pygame.Rect(rect) for rect in changed]):
+            self.restore(rect)
+            self.renderer.mark(rect)
+
+    def restore(self, rect):
+        # Copy the layers back onto the screen inside `rect`, e.g. where an overlay was
+        for layer in self.layers:
+            if layer.visible:
+                self.screen.blit(layer.surface, rect, rect)
+
+    def invalidate_all(self):
+        for layer in self.layers:
+            layer.full = True
+
+    def stats(self):
+        return {layer.name: {'repaints': layer.repaints, 'partial_repaints': layer.partial_repaints}
+                for layer in self.layers}
+
+    def report(self):
+        return "Layers: " + ", ".join(f"{name} {stats['repaints']} repaints + {stats['partial_repaints']} partial"
+                                      for name, stats in self.stats().items())
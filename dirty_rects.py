@@ -0,0 +1,93 @@
+import pygame
+
+def merge_rects(rects):
+    # Union overlapping rects until none overlap
+    merged = []
+    for rect in rects:
+        i = 0
+        while i < len(merged):
+            if merged[i].colliderect(rect):
+                rect = rect.union(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+# Tracks which parts of the back buffer changed this frame and pushes only
+# those rectangles to the display instead of flipping the whole window
+class DirtyRenderer:
+    def __init__(self, screen, full_threshold=0.5):
+        self.screen = screen
+        self.screen_rect = screen.get_rect()
+        self.full_threshold = full_threshold  # Fraction of the window above which a flip is cheaper
+        self.rects = []
+        self.full = True  # First frame always pushes the whole window
+        self.tracked = {}
+        self.seen = set()
+        self.pixels_pushed = 0
+        self.frames = 0
+        self.total_pixels_pushed = 0
+        self.restore = None  # Called with the rect of anything that disappeared, to draw what was under it
+
+    def mark(self, rect):
+        rect = pygame.Rect(rect).clip(self.screen_rect)
+        if self.full or not rect.width or not rect.height:
+            return
+        if rect == self.screen_rect:
+            self.mark_all()
+        else:
+            self.rects.append(rect)
+
+    def mark_all(self):
+        self.full = True
+        self.rects = []
+
+    def track(self, key, value, rect):
+        # Mark the old and new rect of `key` whenever its drawn value or position changes
+        self.seen.add(key)
+        old = self.tracked.get(key)
+        if old is not None and old[0] == value and old[1] == rect:
+            return False
+        if old is not None:
+            self.mark(old[1])
+        self.mark(rect)
+        self.tracked[key] = (value, pygame.Rect(rect))
+        return True
+
+    def blit(self, key, image, pos):
+        rect = self.screen.blit(image, pos)
+        self.track(key, image, rect)
+        return rect
+
+    def present(self):
+        # Anything drawn last frame but not this frame has disappeared and must be cleared
+        for key in [key for key in self.tracked if key not in self.seen]:
+            rect = self.tracked.pop(key)[1]
+            if self.restore:
+                self.restore(rect)
+            self.mark(rect)
+        self.seen = set()
+
+        rects = [] if self.full else merge_rects(self.rects)
+        pixels = sum(rect.width * rect.height for rect in rects)
+        total = self.screen_rect.width * self.screen_rect.height
+        if self.full or pixels > total * self.full_threshold:
+            pygame.display.flip()
+            pixels = total
+        elif rects:
+            pygame.display.update(rects)
+
+        self.pixels_pushed = pixels
+        self.total_pixels_pushed += pixels
+        self.frames += 1
+        self.rects = []
+        self.full = False
+        return pixels
+
+    def stats(self):
+        return {
+            'pixels_pushed': self.pixels_pushed,
+            'average_pixels_pushed': self.total_pixels_pushed / self.frames if self.frames else 0,
+            'frames': self.frames
+        }
@@ -0,0 +1,108 @@
+import json
+import os
+import sys
+import time
+import pygame
+from audio import audio
+
+# Start-up helpers: initialise only the pygame modules the games use, and
+# resolve SysFont names through an on-disk cache instead of scanning the
+# system fonts (fc-list on Linux) on every launch. The cache entry is reused
+# while the modification times of the font directories stay the same.
+CACHE_FILE = os.path.join(".cache", "fonts.json")
+
+if sys.platform == "win32":
+    FONT_DIRS = [os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), "Fonts"),
+                 os.path.join(os.environ.get('LOCALAPPDATA', ''), "Microsoft", "Windows", "Fonts")]
+elif sys.platform == "darwin":
+    FONT_DIRS = ["/Library/Fonts", "/System/Library/Fonts", os.path.expanduser("~/Library/Fonts")]
+else:
+    FONT_DIRS = ["/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.fonts"),
+                 os.path.expanduser("~/.local/share/fonts")]
+
+# Time spent in each start-up phase, printed when TRUC_XANH_STARTUP is set
+class StartupTimer:
+    def __init__(self, enabled=None):
+        self.enabled = bool(os.environ.get('TRUC_XANH_STARTUP')) if enabled is None else enabled
+        self.start = self.last = time.perf_counter()
+        self.phases = {}
+        self.done = False
+
+    def mark(self, phase):
+        # Charge the time since the previous mark to `phase`
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def first_frame(self):
+        # Called after every present; only the first one ends start-up
+        if self.done:
+            return
+        self.done = True
+        self.mark('first_frame')
+        if self.enabled:
+            print(self.report())
+
+    def report(self):
+        lines = [f"  {phase:<12} {ms:8.1f} ms" for phase, ms in self.phases.items()]
+        total = (self.last - self.start) * 1000
+        return "Startup:\n" + "\n".join(lines) + f"\n  {'total':<12} {total:8.1f} ms"
+
+startup = StartupTimer()
+
+def init():
+    # Replaces pygame.init(), which also brings up joystick and other unused subsystems
+    startup.mark('imports')
+    pygame.display.init()
+    pygame.font.init()
+    pygame.time.wait(0)  # Starts the SDL timer that pygame.time.get_ticks() reads
+    try:
+        audio.init()  # Small mixer buffer and a reserved pool of note channels
+    except pygame.error as e:
+        print(f"Audio unavailable: {e}")  # pygame.init() also carries on without a mixer
+    startup.mark('init')
+
+def font_dirs_signature():
+    signature = {}
+    for font_dir in FONT_DIRS:
+        for root, dirs, files in os.walk(font_dir):
+            signature[root] = os.stat(root).st_mtime_ns
+    return signature
+
+def load_cache(cache_file):
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache_file, cache):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_path = cache_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_file)
+    except OSError as e:
+        print(f"Could not cache font paths: {e}")
+
+def font_path(name, bold=False, italic=False, cache_file=CACHE_FILE):
+    # Path of the system font like pygame.font.match_font, or None for the default font
+    signature = font_dirs_signature()
+    cache = load_cache(cache_file)
+    if cache.get('signature') != signature:
+        cache = {'signature': signature, 'fonts': {}}
+    key = f"{name}:{int(bold)}:{int(italic)}"
+    entry = cache['fonts'].get(key)
+    if entry is not None and (entry['path'] is None or os.path.exists(entry['path'])):
+        return entry['path']
+    path = pygame.font.match_font(name, bold, italic)
+    cache['fonts'][key] = {'path': path}
+    save_cache(cache_file, cache)
+    return path
+
+def sys_font(name, size, bold=False, italic=False):
+    # Drop-in for pygame.font.SysFont(name, size) that skips the system font scan when cached
+    font = pygame.font.Font(font_path(name, bold, italic), size)
+    startup.mark('fonts')
+    return font
@@ -0,0 +1,140 @@
+import atexit
+import csv
+import json
+import os
+import time
+from collections import deque
+import pygame
+
+# Per-phase timings of the main loop. Every frame is split into the phases
+# below by calling mark() as each one finishes; the last `history` frames feed
+# a toggleable overlay (rolling percentiles and a frame-time graph) and, when
+# TRUC_XANH_PROFILE names a .csv or .json file, every frame is also kept and
+# written there on exit. Collection is a perf_counter_ns() call and a list
+# store per phase, so it stays on all the time. What it costs is reported as
+# overhead: the bookkeeping inside frame() and mark(), which is kept out of
+# the phases, plus a per-call cost measured once at start-up for the call
+# itself and the clock read before the profiler's own timing starts.
+PHASES = ('wait', 'events', 'update', 'draw', 'overlay', 'present', 'tick', 'sleep')
+PERCENTILES = (50, 95, 99)
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, len(sorted_values) * p // 100)]
+
+def call_cost_ns(calls=2000):
+    # Average cost of a method call that reads the clock, loop included, so it errs on the high side
+    class Probe:
+        def call(self):
+            return time.perf_counter_ns()
+    probe = Probe()
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        probe.call()
+    return (time.perf_counter_ns() - start) // calls
+
+class FrameProfiler:
+    def __init__(self, fps=60, history=300, refresh=15, record_path=None, visible=False):
+        self.budget_ms = 1000.0 / fps
+        self.history = deque(maxlen=history)  # (total_ns, phase_ns...) per frame
+        self.refresh = refresh  # Frames between overlay redraws
+        self.record_path = os.environ.get('TRUC_XANH_PROFILE') if record_path is None else record_path
+        self.samples = [] if self.record_path else None
+        self.visible = visible
+        self.index = {phase: i for i, phase in enumerate(PHASES)}
+        self.current = [0] * len(PHASES)
+        self.frame_start = None
+        self.last = None
+        self.frames = 0
+        self.overhead_ns = 0
+        self.call_ns = call_cost_ns()  # Added to overhead_ns per frame() and mark() call
+        self.elapsed_ns = 0
+        self.surface = None
+        self.font = None
+        if self.record_path:
+            atexit.register(self.export)
+
+    def frame(self):
+        # Close the previous frame and start timing the next one
+        now = time.perf_counter_ns()
+        if self.frame_start is not None:
+            sample = (now - self.frame_start, *self.current)
+            self.history.append(sample)
+            self.elapsed_ns += sample[0]
+            if self.samples is not None:
+                self.samples.append(sample)
+            self.current = [0] * len(PHASES)
+            self.frames += 1
+        self.frame_start = self.last = time.perf_counter_ns()
+        self.overhead_ns += self.last - now + self.call_ns
+
+    def mark(self, phase):
+        # Charge the time since the previous mark to `phase`
+        now = time.perf_counter_ns()
+        if self.last is not None:
+            self.current[self.index[phase]] += now - self.last
+        self.last = time.perf_counter_ns()  # The bookkeeping above goes to overhead, not the next phase
+        self.overhead_ns += self.last - now + self.call_ns
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.surface = None
+
+    def summary(self):
+        columns = list(zip(*self.history)) if self.history else [()] * (len(PHASES) + 1)
+        result = {}
+        for name, column in zip(('total',) + PHASES, columns):
+            values = sorted(column)
+            result[name] = {f'p{p}': percentile(values, p) / 1e6 for p in PERCENTILES}
+        result['overhead_percent'] = 100.0 * self.overhead_ns / self.elapsed_ns if self.elapsed_ns else 0.0
+        return result
+
+    def render(self):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        summary = self.summary()
+        lines = [f"frame p50 {summary['total']['p50']:5.2f}  p95 {summary['total']['p95']:5.2f}  "
+                 f"p99 {summary['total']['p99']:5.2f} ms"]
+        lines += [f"{phase:<8} {summary[phase]['p50']:5.2f} {summary[phase]['p95']:6.2f} {summary[phase]['p99']:6.2f}"
+                  for phase in PHASES]
+        lines.append(f"profiler {summary['overhead_percent']:.2f}% of frame time")
+        line_height = self.font.get_linesize()
+        graph_height = 60
+        surface = pygame.Surface((260, line_height * len(lines) + graph_height + 12))
+        surface.fill((20, 20, 20))
+        for i, line in enumerate(lines):
+            surface.blit(self.font.render(line, True, (230, 230, 230)), (6, 4 + i * line_height))
+
+        # Frame times against a scale of two frame budgets, with the budget as a line
+        top = line_height * len(lines) + 8
+        scale = graph_height / (self.budget_ms * 2)
+        budget_y = top + graph_height - int(self.budget_ms * scale)
+        pygame.draw.line(surface, (200, 80, 80), (0, budget_y), (surface.get_width(), budget_y))
+        totals = [sample[0] / 1e6 for sample in self.history][-surface.get_width():]
+        if len(totals) > 1:
+            points = [(x, top + graph_height - int(min(ms, self.budget_ms * 2) * scale)) for x, ms in enumerate(totals)]
+            pygame.draw.lines(surface, (120, 220, 120), False, points)
+        return surface
+
+    def draw(self, renderer, pos=(0, 0)):
+        if not self.visible:
+            return
+        if self.surface is None or self.frames % self.refresh == 0:
+            self.surface = self.render()
+        renderer.blit('profiler', self.surface, pos)
+
+    def export(self, path=None):
+        path = path or self.record_path
+        if not path or not self.samples:
+            return
+        header = ('total',) + PHASES
+        rows = [[round(ns / 1e6, 4) for ns in sample] for sample in self.samples]
+        if path.endswith('.json'):
+            with open(path, "w") as f:
+                json.dump({'phases': header, 'units': 'ms', 'summary': self.summary(), 'frames': rows}, f)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(('frame',) + header)
+                writer.writerows([i] + row for i, row in enumerate(rows))
@@ -0,0 +1,176 @@
+import random
+from board import Board
+from timers import TimerQueue
+
+# Rules of the memory game without any pygame dependency. Time comes from an
+# injected clock (milliseconds) and shuffling from an injected random.Random,
+# timed effects are callbacks on a TimerQueue that update() runs when due,
+# and every state change is reported to an optional listener as (kind, data):
+#   flip idx, unflip [idx, ...], match (a, b), mismatch (a, b), hint idx,
+#   turn player, game_over winner (0 for a tie)
+FLIP = 'flip'
+UNFLIP = 'unflip'
+MATCH = 'match'
+MISMATCH = 'mismatch'
+HINT = 'hint'
+TURN = 'turn'
+GAME_OVER = 'game_over'
+
+# Notes from the image, shared by main_2 and the server it plays against
+NOTES = [
+    'A2', 'A3', 'A4', 'A5', 'B2', 'B3', 'B4', 'B5', 'C2', 'C3', 'C4', 'C5', 'C6',
+    'D2', 'D3', 'D4', 'D5', 'E2', 'E3', 'E4', 'E5', 'F2', 'F3', 'F4', 'F5',
+    'G2', 'G3', 'G4', 'G5'
+]
+
+class MemoryGame:
+    def __init__(self, notes, clock, rng=None, hints=0, wait_duration=1000, message_duration=1000,
+                 hint_duration=3000, listener=None):
+        self.notes = notes
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.hints = hints
+        self.listener = listener
+        self.state = 'menu'
+        self.mode = None
+        self.board = Board([])
+        self.flipped_cards = []
+        self.current_player = 1
+        self.scores = {1: 0, 2: 0}
+        self.timers = TimerQueue()
+        self.waiting = False
+        self.wait_timer = None
+        self.wait_duration = wait_duration
+        self.message = ""
+        self.message_timer = None
+        self.message_duration = message_duration
+        self.hints_remaining = hints
+        self.hint_timer = None
+        self.hint_duration = hint_duration
+        self.hint_card = None
+
+    def emit(self, kind, data=None):
+        if self.listener:
+            self.listener(kind, data)
+
+    def after(self, delay, callback):
+        # Run callback from update() once more than `delay` ms have passed
+        return self.timers.schedule(self.clock() + delay + 1, callback)
+
+    def cancel_timers(self):
+        # Drop every pending timed effect, e.g. when the game is left for the menu
+        self.timers.clear()
+        self.wait_timer = self.message_timer = self.hint_timer = None
+
+    def deal(self, mode, pairs, reuse=False):
+        # Start a new game; returns the notes that were picked
+        self.cancel_timers()
+        self.mode = mode
+        self.flipped_cards = []
+        self.hint_card = None
+        self.waiting = False
+        self.message = ""
+        self.scores = {1: 0, 2: 0}
+        self.current_player = 1
+        self.hints_remaining = self.hints
+        self.state = 'playing'
+        # Boards get one pair per note, at most one per available note, unless
+        # `reuse` lets a note have 4, 6... cards (the marathon board)
+        if not reuse:
+            pairs = min(pairs, len(self.notes))
+        selected_notes = self.rng.sample(self.notes, min(pairs, len(self.notes)))
+        card_notes = [selected_notes[i % len(selected_notes)] for i in range(pairs)] * 2
+        self.rng.shuffle(card_notes)
+        self.board = Board(card_notes)
+        return selected_notes
+
+    def can_flip(self, idx):
+        return (self.state == 'playing' and not self.waiting and len(self.flipped_cards) < 2
+                and self.board.can_flip(idx))
+
+    def flip(self, idx):
+        if not self.can_flip(idx):
+            return False
+        self.board.flip(idx)
+        self.flipped_cards.append(idx)
+        self.emit(FLIP, idx)
+        if len(self.flipped_cards) == 2:
+            self.check_match()
+        return True
+
+    def set_message(self, text):
+        self.timers.cancel(self.message_timer)
+        self.message = text
+        self.message_timer = self.after(self.message_duration, self.clear_message)
+
+    def clear_message(self):
+        self.message = ""
+        self.message_timer = None
+
+    def check_match(self):
+        first, second = self.flipped_cards
+        if self.board.same_note(first, second):
+            self.board.match(first, second)
+            self.scores[self.current_player] += 1
+            self.flipped_cards = []
+            self.set_message("Match!")
+            self.emit(MATCH, (first, second))
+            if self.board.is_complete():
+                self.state = 'game_over'
+                self.emit(GAME_OVER, self.winner())
+        else:
+            self.waiting = True
+            self.wait_timer = self.after(self.wait_duration, self.end_wait)
+            self.set_message("No Match!")
+            self.emit(MISMATCH, (first, second))
+
+    def winner(self):
+        return 1 if self.scores[1] > self.scores[2] else 2 if self.scores[2] > self.scores[1] else 0
+
+    def use_hint(self):
+        if self.hints_remaining > 0 and len(self.flipped_cards) == 1:
+            partner = self.board.partner(self.flipped_cards[0])
+            if partner is not None:
+                self.hints_remaining -= 1
+                self.show_hint(partner)
+
+    def show_hint(self, idx):
+        self.end_hint()
+        self.board.set_hint(idx)
+        self.hint_card = idx
+        self.hint_timer = self.after(self.hint_duration, self.end_hint)
+        self.emit(HINT, idx)
+
+    def end_hint(self):
+        self.timers.cancel(self.hint_timer)
+        self.hint_timer = None
+        if self.hint_card is not None:
+            self.board.set_hint(self.hint_card, False)
+            self.hint_card = None
+
+    def end_wait(self):
+        # Turn a mismatched pair back over; also safe to call before the delay is up
+        if not self.waiting:
+            return
+        self.timers.cancel(self.wait_timer)
+        self.wait_timer = None
+        for idx in self.flipped_cards:
+            self.board.unflip(idx)
+        self.emit(UNFLIP, self.flipped_cards)
+        self.flipped_cards = []
+        self.waiting = False
+        if self.mode == 'multi':
+            self.current_player = 2 if self.current_player == 1 else 1
+            self.emit(TURN, self.current_player)
+
+    def update(self):
+        # Fire the timers that are due; returns the clock time they fired at, or None if none was due
+        now = self.clock()
+        return now if self.timers.run(now) else None
+
+    def next_deadline(self):
+        # Earliest clock time at which update() has something to do, or None when nothing is pending
+        return self.timers.next_deadline()
+
+    def is_idle(self):
+        return self.next_deadline() is None
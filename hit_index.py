@@ -0,0 +1,65 @@
+# Constant-time pointer lookups for the card grid and the on-screen buttons
+
+class GridIndex:
+    # Maps a position straight to a card index from the regular grid layout
+    def __init__(self, start_x, start_y, card_width, card_height, spacing_x, spacing_y, cols, rows, count):
+        self.start_x = start_x
+        self.start_y = start_y
+        self.card_width = card_width
+        self.card_height = card_height
+        self.spacing_x = spacing_x
+        self.spacing_y = spacing_y
+        self.cols = cols
+        self.rows = rows
+        self.count = count
+
+    def index_at(self, pos):
+        dx = pos[0] - self.start_x
+        dy = pos[1] - self.start_y
+        if dx < 0 or dy < 0:
+            return None
+        col, offset_x = divmod(dx, self.spacing_x)
+        row, offset_y = divmod(dy, self.spacing_y)
+        if col >= self.cols or row >= self.rows or offset_x >= self.card_width or offset_y >= self.card_height:
+            return None  # Outside the board or in the margin between cards
+        idx = row * self.cols + col
+        return idx if idx < self.count else None
+
+    def card_rect(self, idx):
+        row, col = divmod(idx, self.cols)
+        return (self.start_x + col * self.spacing_x, self.start_y + row * self.spacing_y,
+                self.card_width, self.card_height)
+
+    def indices_between(self, top, bottom):
+        # Cards of the rows that overlap the band top <= y < bottom
+        first = max(0, (top - self.start_y - self.card_height) // self.spacing_y + 1)
+        last = min(self.rows - 1, (bottom - 1 - self.start_y) // self.spacing_y)
+        return range(first * self.cols, min(self.count, (last + 1) * self.cols)) if first <= last else range(0)
+
+class ButtonIndex:
+    # Buckets buttons into a coarse grid so a position only tests the buttons of one cell
+    def __init__(self, buttons, cell_size=50):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.hovered = None
+        for button in buttons:
+            rect = button.rect
+            for cx in range(rect.left // cell_size, (rect.right - 1) // cell_size + 1):
+                for cy in range(rect.top // cell_size, (rect.bottom - 1) // cell_size + 1):
+                    self.cells.setdefault((cx, cy), []).append(button)
+
+    def button_at(self, pos):
+        for button in self.cells.get((pos[0] // self.cell_size, pos[1] // self.cell_size), ()):
+            if button.rect.collidepoint(pos):
+                return button
+        return None
+
+    def hover(self, pos):
+        # Only the button under the pointer and the previously hovered one change state
+        button = self.button_at(pos)
+        if button is not self.hovered:
+            if self.hovered:
+                self.hovered.hovered = False
+            if button:
+                button.hovered = True
+            self.hovered = button
@@ -0,0 +1,52 @@
+import os
+import time
+import pygame
+
+# Frames-per-minute and CPU usage of the main loop, printed once a minute
+# when TRUC_XANH_LOOP_STATS is set so the idle loop cost can be checked
+class LoopStats:
+    def __init__(self, interval=60.0, enabled=None):
+        self.interval = interval
+        self.enabled = bool(os.environ.get('TRUC_XANH_LOOP_STATS')) if enabled is None else enabled
+        self.report = None
+        self.reset()
+
+    def reset(self):
+        self.start_time = time.monotonic()
+        self.start_cpu = time.process_time()
+        self.frames = 0
+        self.idle_waits = 0
+
+    def frame(self, idle=False):
+        self.frames += 1
+        if idle:
+            self.idle_waits += 1
+        elapsed = time.monotonic() - self.start_time
+        if elapsed >= self.interval:
+            self.report = {
+                'frames_per_minute': self.frames * 60.0 / elapsed,
+                'cpu_percent': 100.0 * (time.process_time() - self.start_cpu) / elapsed,
+                'idle_frames': self.idle_waits
+            }
+            if self.enabled:
+                print(f"Loop: {self.report['frames_per_minute']:.0f} frames/min, "
+                      f"CPU {self.report['cpu_percent']:.1f}%, {self.idle_waits} idle wakeups")
+            self.reset()
+
+    def ms_until_report(self):
+        return max(1, int((self.interval - (time.monotonic() - self.start_time)) * 1000))
+
+def idle_timeout(deadline, stats):
+    # Sleep until the next game deadline (in pygame ticks), waking early for the stats report
+    timeout = stats.ms_until_report() if stats.enabled else 0
+    if deadline is not None:
+        remaining = max(1, deadline - pygame.time.get_ticks())
+        timeout = min(timeout, remaining) if timeout else remaining
+    return timeout
+
+def wait_for_events(timeout):
+    # Block on the event queue instead of polling; a timeout of 0 waits forever
+    event = pygame.event.wait(timeout) if timeout else pygame.event.wait()
+    events = [] if event.type == pygame.NOEVENT else [event]
+    events.extend(pygame.event.get())
+    return events
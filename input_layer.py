@@ -0,0 +1,79 @@
+import atexit
+import os
+import pygame
+
+# Event types the games handle; set_blocked keeps everything else SDL
+# produces (other window events, text input, touch, joystick...) out of the
+# queue. Only changed rects reach the display, so a window that was exposed or
+# restored has to be repainted whole: REPAINT_EVENTS are let through for that.
+REPAINT_EVENTS = (pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED)
+GAME_EVENTS = (pygame.QUIT, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEWHEEL,
+               pygame.KEYDOWN) + REPAINT_EVENTS
+
+# Routes each frame's events to handlers looked up by event type (and, for
+# KEYDOWN, by key first). All the MOUSEMOTION events of a frame collapse into
+# the latest position, which the motion handler gets once after the other
+# events, so a high-rate mouse costs one hover test per frame instead of one
+# per event. With TRUC_XANH_INPUT_STATS set, queue depth and events handled
+# per frame are printed at exit.
+class InputLayer:
+    def __init__(self, allowed=GAME_EVENTS, enabled=None):
+        self.handlers = {}  # event type -> handler(event)
+        self.keys = {}  # key -> handler(), tried before the KEYDOWN handler
+        self.quit = False
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(list(allowed))
+        self.frames = 0
+        self.queued = 0  # Events taken off the queue
+        self.handled = 0  # Handler calls, with a frame's motion counted once
+        self.max_depth = 0
+        self.depth = 0  # Events taken off the queue in the last frame
+        if os.environ.get('TRUC_XANH_INPUT_STATS') if enabled is None else enabled:
+            atexit.register(lambda: print(self.report()))
+
+    def on(self, event_type, handler):
+        self.handlers[event_type] = handler
+
+    def on_key(self, key, handler):
+        self.keys[key] = handler
+
+    def dispatch(self, events):
+        # Handle one frame's events; returns False once QUIT has been seen
+        handlers = self.handlers
+        motion = None
+        handled = 0
+        for event in events:
+            if event.type == pygame.MOUSEMOTION:
+                motion = event
+                continue
+            if event.type == pygame.QUIT:
+                self.quit = True
+                break
+            if event.type == pygame.KEYDOWN and event.key in self.keys:
+                self.keys[event.key]()
+                handled += 1
+                continue
+            handler = handlers.get(event.type)
+            if handler:
+                handler(event)
+                handled += 1
+        if motion is not None and pygame.MOUSEMOTION in handlers and not self.quit:
+            handlers[pygame.MOUSEMOTION](motion)
+            handled += 1
+        self.frames += 1
+        self.depth = len(events)
+        self.queued += self.depth
+        self.handled += handled
+        self.max_depth = max(self.max_depth, self.depth)
+        return not self.quit
+
+    def stats(self):
+        frames = self.frames or 1
+        return {'frames': self.frames, 'average_queue_depth': self.queued / frames, 'max_queue_depth': self.max_depth,
+                'average_handled': self.handled / frames, 'merged': self.queued - self.handled}
+
+    def report(self):
+        stats = self.stats()
+        return (f"Input: {stats['frames']} frames, queue depth {stats['average_queue_depth']:.2f} avg / "
+                f"{stats['max_queue_depth']} max, {stats['average_handled']:.2f} events handled per frame, "
+                f"{stats['merged']} merged or ignored")
@@ -0,0 +1,80 @@
+import math
+import pygame
+from hit_index import GridIndex
+
+# Rows scrolled by the arrow and page keys
+SCROLL_KEYS = {pygame.K_UP: -1, pygame.K_DOWN: 1, pygame.K_PAGEUP: -4, pygame.K_PAGEDOWN: 4}
+
+# Board layout for any number of cards. compute_layout picks the column count
+# and card size that fill the board area best: the largest card size up to
+# `max_size`, then the fewest empty slots, then the shape closest to the area's.
+# When even `min_size` cards do not fit, the board keeps min_size cards and
+# becomes taller than the area, and a Viewport scrolls it.
+class Layout:
+    def __init__(self, count, cols, card_size, margin, area):
+        self.count = count
+        self.cols = cols
+        self.rows = -(-count // cols)
+        self.card_size = card_size
+        self.margin = margin
+        self.pitch = card_size + margin
+        self.area = pygame.Rect(area)
+        self.width = self.cols * self.pitch - margin
+        self.height = self.rows * self.pitch - margin
+        # Centred in the area; a board taller than the area starts at its top
+        self.start_x = self.area.x + max(0, (self.area.width - self.width) // 2)
+        self.start_y = self.area.y + max(0, (self.area.height - self.height) // 2)
+
+    def grid_index(self):
+        return GridIndex(self.start_x, self.start_y, self.card_size, self.card_size, self.pitch, self.pitch,
+                         self.cols, self.rows, self.count)
+
+def compute_layout(count, area, max_size, min_size=None, margin=10):
+    area = pygame.Rect(area)
+    min_size = min_size or max_size
+    target_aspect = area.width / area.height
+    best, best_score = None, None
+    for cols in range(1, count + 1):
+        rows = -(-count // cols)
+        size = min((area.width + margin) // cols - margin, (area.height + margin) // rows - margin, max_size)
+        if size < min_size:
+            continue
+        score = (size, -(rows * cols - count), -abs(math.log(cols / rows / target_aspect)))
+        if best_score is None or score > best_score:
+            best, best_score = (cols, size), score
+    if best is None:
+        best = (max(1, min(count, (area.width + margin) // (min_size + margin))), min_size)
+    return Layout(count, best[0], best[1], margin, area)
+
+# The part of the board shown in the layout's area. Scrolling moves the grid
+# index with the board so hit-testing keeps working in screen coordinates, and
+# only the rows crossing the area are handed out for drawing.
+class Viewport:
+    def __init__(self, layout):
+        self.layout = layout
+        self.area = layout.area
+        self.index = layout.grid_index()
+        self.scroll = 0
+        self.max_scroll = max(0, layout.height - self.area.height)
+
+    def scroll_by(self, dy):
+        scroll = min(max(self.scroll + dy, 0), self.max_scroll)
+        if scroll == self.scroll:
+            return False
+        self.scroll = scroll
+        self.index.start_y = self.layout.start_y - scroll
+        return True
+
+    def visible_indices(self):
+        return self.index.indices_between(self.area.top, self.area.bottom)
+
+    def index_at(self, pos):
+        return self.index.index_at(pos) if self.area.collidepoint(pos) else None
+
+    def scrollbar(self, width=6):
+        # Thumb rect on the right edge of the area, or None when everything fits
+        if not self.max_scroll:
+            return None
+        height = max(20, self.area.height * self.area.height // self.layout.height)
+        y = self.area.top + (self.area.height - height) * self.scroll // self.max_scroll
+        return pygame.Rect(self.area.right - width, y, width, height)
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+from game_logic import MemoryGame
+from net_client import NetClient
+from server import clock
+
+# Load test for server.py: `--sessions` games at once, each with its own bot
+# clients on separate connections. Bots remember every note they have seen,
+# take a known pair when there is one and otherwise flip an unknown card, then
+# rejoin when their game ends, so every session keeps playing until
+# `--duration` is up. Reports games finished, messages per second and the
+# flip round trip (request sent to its diff received) percentiles.
+class Bot(NetClient):
+    def __init__(self, rng, pairs, players, think_ms):
+        super().__init__(MemoryGame([], clock))
+        self.rng = rng
+        self.pairs = pairs
+        self.want_players = players
+        self.think_ms = think_ms
+        self.known = {}  # note -> card positions seen face up and not matched
+        self.received = 0
+        self.games = 0
+        self.running = True
+        self.acting = False
+
+    def start(self):
+        self.known = {}
+        self.join(self.pairs, self.want_players)
+
+    def apply(self, message):
+        super().apply(message)
+        self.received += 1
+        kind = message['t']
+        board = self.game.board
+        if kind in ('f', 'h'):
+            positions = self.known.setdefault(message['n'], [])
+            if message['i'] not in positions:
+                positions.append(message['i'])
+        elif kind == 'm':
+            for idx in message['i']:
+                positions = self.known.get(board.note(idx), [])
+                if idx in positions:
+                    positions.remove(idx)
+        elif kind == 'o':
+            self.games += 1
+            if self.running:
+                self.start()
+            return
+        elif kind == 'left':
+            if self.running:
+                self.start()
+            return
+        self.schedule()
+
+    def schedule(self):
+        if self.acting or not self.running or self.game.state != 'playing' or not self.my_turn():
+            return
+        if len(self.game.flipped_cards) >= 2 or self.pending_flip:
+            return
+        self.acting = True
+        if self.think_ms:
+            asyncio.get_running_loop().call_later(self.think_ms / 1000, self.act)
+        else:
+            asyncio.get_running_loop().call_soon(self.act)
+
+    def act(self):
+        self.acting = False
+        if self.game.state != 'playing' or not self.my_turn() or len(self.game.flipped_cards) >= 2:
+            return
+        board = self.game.board
+        choice = None
+        if self.game.flipped_cards:
+            first = self.game.flipped_cards[0]
+            partners = [idx for idx in self.known.get(board.note(first), []) if idx != first]
+            if partners:
+                choice = partners[0]
+        else:
+            for positions in self.known.values():
+                if len(positions) >= 2:
+                    choice = positions[0]
+                    break
+        if choice is None or not self.game.can_flip(choice):
+            seen = {idx for positions in self.known.values() for idx in positions}
+            candidates = [idx for idx in range(len(board)) if board.can_flip(idx) and idx not in seen]
+            if not candidates:
+                candidates = [idx for idx in range(len(board)) if board.can_flip(idx)]
+            if not candidates:
+                return
+            choice = self.rng.choice(candidates)
+        self.flip(choice)
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, len(sorted_values) * p // 100)] if sorted_values else 0.0
+
+async def run(args):
+    rng = random.Random(args.seed)
+    bots = [Bot(random.Random(rng.random()), args.pairs, args.players, args.think_ms)
+            for _ in range(args.sessions * args.players)]
+    connect_limit = asyncio.Semaphore(200)
+
+    async def connect(bot):
+        async with connect_limit:
+            await bot.connect(args.host, args.port)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connect(bot) for bot in bots))
+    connected = time.perf_counter() - start
+    print(f"Connected {len(bots)} clients in {connected:.2f} s")
+    # Seat-order joins pair consecutive bots into the same session
+    for bot in bots:
+        bot.start()
+    start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    elapsed = time.perf_counter() - start
+    for bot in bots:
+        bot.running = False
+    games = sum(bot.games for bot in bots) // args.players
+    received = sum(bot.received for bot in bots)
+    round_trips = sorted(ms for bot in bots for ms in bot.round_trips)
+    errors = sum(bot.errors for bot in bots)
+    print(f"{args.sessions} sessions x {args.players} players, {args.pairs} pairs, {elapsed:.1f} s")
+    print(f"  games finished: {games} ({games * 60 / elapsed:.0f}/min)")
+    print(f"  messages received: {received} ({received / elapsed:.0f}/s), errors: {errors}")
+    print(f"  flip round trip: p50 {percentile(round_trips, 50):.2f} ms, p95 {percentile(round_trips, 95):.2f} ms, "
+          f"p99 {percentile(round_trips, 99):.2f} ms over {len(round_trips)} flips")
+    for bot in bots:
+        bot.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the Truc Xanh Music game server")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--players', type=int, choices=(1, 2), default=2)
+    parser.add_argument('--pairs', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--think-ms', type=int, default=0, help="delay before each bot flip")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn', action='store_true', help="start server.py in a subprocess for the run")
+    parser.add_argument('--wait-ms', type=int, default=100, help="mismatch delay for the spawned server")
+    args = parser.parse_args()
+    server = None
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, "server.py", "--host", args.host, "--port", str(args.port),
+                                   "--wait-ms", str(args.wait_ms), "--stats", str(args.duration / 2)])
+        time.sleep(1.0)
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
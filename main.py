@@ -1,16 +1,33 @@
 import pygame
-import random
 import asyncio
 import platform
 from math import floor
+import fast_start
+from fast_start import startup, sys_font
+from audio import audio
+from text_cache import text_cache
+from dirty_rects import DirtyRenderer
+from compositor import Compositor
+from frame_profiler import FrameProfiler
+from input_layer import InputLayer, REPAINT_EVENTS
+from idle_loop import LoopStats, idle_timeout, wait_for_events
+from synth_bank import SynthBank, key_number
+from hit_index import ButtonIndex
+from replay import start_recording
+from layout import compute_layout, Viewport, SCROLL_KEYS
+from game_logic import MemoryGame, FLIP, UNFLIP, MATCH, HINT
+from animation import FrameTables, CardAnimations
 
-# Initialize Pygame
-pygame.init()
+# Initialize only the pygame modules the game uses
+fast_start.init()
 
 # Screen setup
 WIDTH, HEIGHT = 800, 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
+renderer = DirtyRenderer(screen)
+compositor = Compositor(screen, renderer)
 pygame.display.set_caption("Trúc Xanh Music")
+startup.mark('display')
 
 # Colors
 WHITE = (255, 255, 255)
@@ -20,10 +37,22 @@ GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 HIGHLIGHT = (200, 200, 200)
 
+# Card animations
+frame_tables = FrameTables(GRAY)  # Flip and match frames per note and card size
+animations = CardAnimations(pygame.time.get_ticks)
+
 # Game settings
 FPS = 60
 CARD_WIDTH, CARD_HEIGHT = 60, 60
 CARD_MARGIN = 10
+MIN_CARD_SIZE = 40  # Cards shrink to this on big boards, which then scroll
+BOARD_AREA = pygame.Rect(0, 50, WIDTH, HEIGHT - 100)  # Between the scores and the messages
+MARATHON_CARDS = 400
+MENU_KEYS = {  # Keyboard shortcuts for the menu buttons: key -> (setting, value)
+    pygame.K_1: ('mode', 'single'), pygame.K_2: ('mode', 'multi'),
+    pygame.K_3: ('grid_size', 50), pygame.K_4: ('grid_size', 30), pygame.K_5: ('grid_size', MARATHON_CARDS)
+}
+SCROLL_STEP = 40  # Pixels per mouse wheel notch
 NOTES = ['C', 'D', 'E', 'F', 'G', 'A', 'B']
 NOTE_COLORS = {
     'C': (255, 0, 0), 'D': (255, 165, 0), 'E': (255, 255, 0),
@@ -31,32 +60,12 @@ NOTE_COLORS = {
 }
 
 # Font
-font = pygame.font.SysFont('arial', 36)
-
-# Sound generation
-def create_note_sound(frequency, duration=0.5, sample_rate=44100):
-    import numpy as np
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-    wave = 0.5 * np.sin(2 * np.pi * frequency * t)
-    sound = (wave * 32767).astype(np.int16)
-    return pygame.sndarray.make_sound(np.column_stack((sound, sound)))
-
-NOTE_SOUNDS = {
-    'C': create_note_sound(261.63),  # C4
-    'D': create_note_sound(293.66),  # D4
-    'E': create_note_sound(329.63),  # E4
-    'F': create_note_sound(349.23),  # F4
-    'G': create_note_sound(392.00),  # G4
-    'A': create_note_sound(440.00),  # A4
-    'B': create_note_sound(493.88)   # B4
-}
+font = sys_font('arial', 36)
 
-class Card:
-    def __init__(self, note, x, y):
-        self.note = note
-        self.rect = pygame.Rect(x, y, CARD_WIDTH, CARD_HEIGHT)
-        self.is_flipped = False
-        self.is_matched = False
+# Sound generation: notes are synthesised on demand when a game picks them
+synth = SynthBank()
+startup.mark('assets')
+NOTE_KEYS = {note: key_number(f"{note}4") for note in NOTES}  # C4 to B4
 
 class Button:
     def __init__(self, text, x, y, width, height):
@@ -68,196 +77,287 @@ class Button:
         color = HIGHLIGHT if self.hovered else WHITE
         pygame.draw.rect(surface, color, self.rect)
         pygame.draw.rect(surface, BLACK, self.rect, 2)
-        text_surface = font.render(self.text, True, BLACK)
+        text_surface = text_cache.render(font, self.text, True, BLACK)
         surface.blit(text_surface, (self.rect.x + (self.rect.width - text_surface.get_width()) // 2,
                                   self.rect.y + (self.rect.height - text_surface.get_height()) // 2))
+        return self.rect
 
     def check_hover(self, pos):
         self.hovered = self.rect.collidepoint(pos)
 
-class Game:
+class Game(MemoryGame):
     def __init__(self):
-        self.state = 'menu'
-        self.mode = None
+        super().__init__(NOTES, pygame.time.get_ticks, listener=self.on_event)
         self.grid_size = None
-        self.cards = []
-        self.flipped_cards = []
-        self.current_player = 1
-        self.scores = {1: 0, 2: 0}
-        self.waiting = False
-        self.wait_start_time = 0
-        self.wait_duration = 1000  # 1 second wait
-        self.message = ""
-        self.message_timer = 0
         self.buttons = [
             Button("1 Player", WIDTH // 2 - 100, 200, 200, 50),
             Button("2 Players", WIDTH // 2 - 100, 260, 200, 50),
             Button("25 Pairs", WIDTH // 2 - 100, 320, 200, 50),
             Button("15 Pairs", WIDTH // 2 - 100, 380, 200, 50)
         ]
+        self.button_index = ButtonIndex(self.buttons)
+        self.card_index = None
+        self.viewport = None
+        self.painted = (None, None)  # Board and card flags the board layer was last painted with
+        self.face_images = {}  # (note, size) -> face surface
+        compositor.add('background', self.paint_background, alpha=False)
+        compositor.add('board', self.paint_board)
+        compositor.add('hud', self.paint_hud)
 
     def setup_game(self, mode, grid_size):
-        self.mode = mode
         self.grid_size = grid_size
-        self.cards = []
-        self.flipped_cards = []
-        self.scores = {1: 0, 2: 0}
-        self.current_player = 1
-        self.state = 'playing'
-
-        # Create card pairs
-        pairs = grid_size // 2
-        selected_notes = random.sample(NOTES, min(pairs, len(NOTES)))
-        card_notes = selected_notes * 2
-        random.shuffle(card_notes)
-
-        # Calculate grid dimensions
-        rows = 5
-        cols = grid_size // 5
-        start_x = (WIDTH - (cols * (CARD_WIDTH + CARD_MARGIN) - CARD_MARGIN)) // 2
-        start_y = (HEIGHT - (rows * (CARD_HEIGHT + CARD_MARGIN) - CARD_MARGIN)) // 2
-
-        # Create cards
-        for i in range(rows):
-            for j in range(cols):
-                idx = i * cols + j
-                if idx < len(card_notes):
-                    x = start_x + j * (CARD_WIDTH + CARD_MARGIN)
-                    y = start_y + i * (CARD_HEIGHT + CARD_MARGIN)
-                    self.cards.append(Card(card_notes[idx], x, y))
 
-    def draw(self):
-        screen.fill(WHITE)
+        # Deal the card pairs and lay them out; boards too big for the window scroll
+        selected_notes = self.deal(mode, grid_size // 2, reuse=grid_size == MARATHON_CARDS)
+        synth.prepare([NOTE_KEYS[note] for note in selected_notes])
+        self.viewport = Viewport(compute_layout(len(self.board), BOARD_AREA, CARD_WIDTH, MIN_CARD_SIZE, CARD_MARGIN))
+        self.card_index = self.viewport.index
+        animations.clear()
+        card_size = (self.card_index.card_width, self.card_index.card_height)
+        frame_tables.prepare(selected_notes, lambda note: self.face_image(note, card_size), card_size)
+
+    def scroll(self, dy):
+        self.viewport.scroll_by(dy)  # The board layer is keyed on the scroll offset
+
+    def on_event(self, kind, data):
+        if kind == FLIP:
+            audio.play_note(synth.sound(NOTE_KEYS[self.board.note(data)]))
+        self.animate(kind, data)
+
+    def animate(self, kind, data):
+        # Flips, hints, unflips and matches play frames from the precomputed tables
+        if kind in (FLIP, HINT):
+            cards, table = [data], frame_tables.flip
+        elif kind == UNFLIP:
+            cards, table = data, frame_tables.unflip
+        elif kind == MATCH:
+            cards, table = data, frame_tables.match
+        else:
+            return
+        card_size = (self.card_index.card_width, self.card_index.card_height)
+        for idx in cards:
+            note = self.board.note(idx)
+            animations.start(idx, table(note, self.face_image(note, card_size), card_size))
+
+    def is_idle(self):
+        return super().is_idle() and animations.is_idle()
+
+    def face_image(self, note, size):
+        # The face draw_card paints, as a surface for the animation frame tables
+        image = self.face_images.get((note, size))
+        if image is None:
+            image = self.face_images[(note, size)] = pygame.Surface(size).convert()
+            image.fill(NOTE_COLORS[note])
+            text = text_cache.render(font, note, True, BLACK)
+            image.blit(text, ((size[0] - text.get_width()) // 2, (size[1] - text.get_height()) // 2))
+        return image
+
+    def draw_card(self, surface, idx):
+        note = self.board.note(idx)
+        rect = self.card_index.card_rect(idx)
+        frame = animations.frame(idx)
+        if frame:
+            image, (dx, dy) = frame
+            surface.blit(image, (rect[0] + dx, rect[1] + dy))
+        elif self.board.is_face_up(idx):
+            pygame.draw.rect(surface, NOTE_COLORS[note], rect)
+            text = text_cache.render(font, note, True, BLACK)
+            surface.blit(text, (rect[0] + (rect[2] - text.get_width()) // 2, rect[1] + (rect[3] - text.get_height()) // 2))
+        else:
+            pygame.draw.rect(surface, GRAY, rect)
+
+    def paint_background(self, surface, area):
+        surface.fill(WHITE)
+        if self.state == 'menu':
+            title = text_cache.render(font, "Trúc Xanh Music", True, BLACK)
+            surface.blit(title, (WIDTH // 2 - title.get_width() // 2, 100))
+            instruction = text_cache.render(font, "Select mode and grid size", True, BLACK)
+            surface.blit(instruction, (WIDTH // 2 - instruction.get_width() // 2, 150))
+        elif self.state == 'game_over':
+            restart = text_cache.render(font, "Press [R] to Restart", True, BLACK)
+            surface.blit(restart, (WIDTH // 2 - restart.get_width() // 2, HEIGHT // 2 + 50))
+
+    def paint_board(self, surface, area):
+        band = area.clip(BOARD_AREA)  # Only cards in view are drawn, and never over the scores
+        surface.set_clip(band)
+        for idx in self.card_index.indices_between(band.top, band.bottom):
+            if band.colliderect(self.card_index.card_rect(idx)):
+                self.draw_card(surface, idx)
+        surface.set_clip(area)
+        scrollbar = self.viewport.scrollbar()
+        if scrollbar:
+            pygame.draw.rect(surface, GRAY, scrollbar)
+        return [BOARD_AREA]
+
+    def paint_hud(self, surface, area):
+        drawn = []
         if self.state == 'menu':
-            title = font.render("Trúc Xanh Music", True, BLACK)
-            screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 100))
-            instruction = font.render("Select mode and grid size", True, BLACK)
-            screen.blit(instruction, (WIDTH // 2 - instruction.get_width() // 2, 150))
             for button in self.buttons:
-                button.draw(screen)
+                drawn.append(button.draw(surface))
             if self.mode:
-                mode_text = font.render(f"Mode: {'1 Player' if self.mode == 'single' else '2 Players'}", True, BLACK)
-                screen.blit(mode_text, (WIDTH // 2 - mode_text.get_width() // 2, 450))
+                mode_text = text_cache.render(font, f"Mode: {'1 Player' if self.mode == 'single' else '2 Players'}", True, BLACK)
+                drawn.append(surface.blit(mode_text, (WIDTH // 2 - mode_text.get_width() // 2, 450)))
             if self.grid_size:
-                grid_text = font.render(f"Grid: {self.grid_size // 2} Pairs", True, BLACK)
-                screen.blit(grid_text, (WIDTH // 2 - grid_text.get_width() // 2, 500))
+                grid_text = text_cache.render(font, f"Grid: {self.grid_size // 2} Pairs", True, BLACK)
+                drawn.append(surface.blit(grid_text, (WIDTH // 2 - grid_text.get_width() // 2, 500)))
         elif self.state == 'playing':
-            for card in self.cards:
-                if card.is_matched or card.is_flipped:
-                    pygame.draw.rect(screen, NOTE_COLORS[card.note], card.rect)
-                    text = font.render(card.note, True, BLACK)
-                    screen.blit(text, (card.rect.x + 20, card.rect.y + 20))
-                else:
-                    pygame.draw.rect(screen, GRAY, card.rect)
-            score_text = font.render(f"Player 1: {self.scores[1]}", True, BLUE)
-            screen.blit(score_text, (10, 10))
+            score_text = text_cache.render(font, f"Player 1: {self.scores[1]}", True, BLUE)
+            drawn.append(surface.blit(score_text, (10, 10)))
             if self.mode == 'multi':
-                score_text2 = font.render(f"Player 2: {self.scores[2]}", True, GREEN)
-                screen.blit(score_text2, (WIDTH - score_text2.get_width() - 10, 10))
-                player_text = font.render(f"Turn: Player {self.current_player}", True, BLACK)
-                screen.blit(player_text, (WIDTH // 2 - player_text.get_width() // 2, 10))
+                score_text2 = text_cache.render(font, f"Player 2: {self.scores[2]}", True, GREEN)
+                drawn.append(surface.blit(score_text2, (WIDTH - score_text2.get_width() - 10, 10)))
+                player_text = text_cache.render(font, f"Turn: Player {self.current_player}", True, BLACK)
+                drawn.append(surface.blit(player_text, (WIDTH // 2 - player_text.get_width() // 2, 10)))
             if self.message:
-                msg_surface = font.render(self.message, True, BLACK)
-                screen.blit(msg_surface, (WIDTH // 2 - msg_surface.get_width() // 2, HEIGHT - 50))
+                msg_surface = text_cache.render(font, self.message, True, BLACK)
+                drawn.append(surface.blit(msg_surface, (WIDTH // 2 - msg_surface.get_width() // 2, HEIGHT - 50)))
         elif self.state == 'game_over':
             winner = 1 if self.scores[1] > self.scores[2] else 2 if self.scores[2] > self.scores[1] else 0
             if self.mode == 'single':
-                text = font.render(f"Game Over! Score: {self.scores[1]}", True, BLACK)
+                text = text_cache.render(font, f"Game Over! Score: {self.scores[1]}", True, BLACK)
             else:
-                text = font.render(f"Game Over! Player {winner} Wins!" if winner else "Game Over! Tie!", True, BLACK)
-            screen.blit(text, (WIDTH // 2 - text.get_width() // 2, HEIGHT // 2))
-            restart = font.render("Press [R] to Restart", True, BLACK)
-            screen.blit(restart, (WIDTH // 2 - restart.get_width() // 2, HEIGHT // 2 + 50))
+                text = text_cache.render(font, f"Game Over! Player {winner} Wins!" if winner else "Game Over! Tie!", True, BLACK)
+            drawn.append(surface.blit(text, (WIDTH // 2 - text.get_width() // 2, HEIGHT // 2)))
+        return drawn
+
+    def draw(self):
+        # Each layer is repainted only when its key changes; flipped cards repaint just their rects
+        compositor.update('background', self.state)
+        if self.state == 'playing':
+            compositor.update('board', (self.board, self.viewport.scroll))
+            self.invalidate_cards()
+            for idx, bounds in animations.advance():
+                x, y = self.card_index.card_rect(idx)[:2]
+                compositor.invalidate('board', bounds.move(x, y))
+        else:
+            animations.clear()  # Nothing left to animate once the board is gone
+            compositor.update('board', None)
+        compositor.update('hud', (self.state, self.mode, self.grid_size, self.scores[1], self.scores[2],
+                                  self.current_player, self.message, self.button_index.hovered))
+        compositor.compose()
+
+    def invalidate_cards(self):
+        # Repaint just the visible cards whose flags changed since they were painted
+        if self.painted[0] is not self.board:
+            self.painted = (self.board, bytearray(self.board.flags))
+        flags, painted = self.board.flags, self.painted[1]
+        if flags != painted:
+            for idx in self.viewport.visible_indices():
+                if flags[idx] != painted[idx]:
+                    compositor.invalidate('board', self.card_index.card_rect(idx))
+            painted[:] = flags
+
+    def handle_key(self, key):
+        if self.state == 'menu':
+            if key in MENU_KEYS:
+                setattr(self, *MENU_KEYS[key])
+            if self.mode and self.grid_size:
+                self.setup_game(self.mode, self.grid_size)
+        elif self.state == 'playing' and key in SCROLL_KEYS:
+            self.scroll(SCROLL_KEYS[key] * self.viewport.layout.pitch)
+        elif self.state == 'game_over' and key == pygame.K_r:
+            self.state = 'menu'
+            self.mode = None
+            self.grid_size = None
+
+    def hover(self, pos):
+        if self.state == 'menu':
+            self.button_index.hover(pos)
 
     def handle_click(self, pos):
         if self.state == 'menu':
-            for button in self.buttons:
-                if button.rect.collidepoint(pos):
-                    if button.text == "1 Player":
-                        self.mode = 'single'
-                    elif button.text == "2 Players":
-                        self.mode = 'multi'
-                    elif button.text == "25 Pairs":
-                        self.grid_size = 50
-                    elif button.text == "15 Pairs":
-                        self.grid_size = 30
-                    if self.mode and self.grid_size:
-                        self.setup_game(self.mode, self.grid_size)
-        elif self.state == 'playing' and not self.waiting:
-            for card in self.cards:
-                if card.rect.collidepoint(pos) and not card.is_flipped and not card.is_matched:
-                    card.is_flipped = True
-                    NOTE_SOUNDS[card.note].play()
-                    self.flipped_cards.append(card)
-                    if len(self.flipped_cards) == 2:
-                        self.check_match()
-
-    def check_match(self):
-        card1, card2 = self.flipped_cards
-        if card1.note == card2.note:
-            card1.is_matched = card2.is_matched = True
-            self.scores[self.current_player] += 1
-            self.flipped_cards = []
-            self.message = "Match!"
-            self.message_timer = pygame.time.get_ticks()
-            if all(card.is_matched for card in self.cards):
-                self.state = 'game_over'
-        else:
-            self.waiting = True
-            self.wait_start_time = pygame.time.get_ticks()
-            self.message = "No Match!"
-            self.message_timer = pygame.time.get_ticks()
-
-    def update(self):
-        if self.waiting and pygame.time.get_ticks() - self.wait_start_time > self.wait_duration:
-            for card in self.flipped_cards:
-                card.is_flipped = False
-            self.flipped_cards = []
-            self.waiting = False
-            if self.mode == 'multi':
-                self.current_player = 2 if self.current_player == 1 else 1
-        if self.message and pygame.time.get_ticks() - self.message_timer > 1000:
-            self.message = ""
+            button = self.button_index.button_at(pos)
+            if button:
+                if button.text == "1 Player":
+                    self.mode = 'single'
+                elif button.text == "2 Players":
+                    self.mode = 'multi'
+                elif button.text == "25 Pairs":
+                    self.grid_size = 50
+                elif button.text == "15 Pairs":
+                    self.grid_size = 30
+                if self.mode and self.grid_size:
+                    self.setup_game(self.mode, self.grid_size)
+        elif self.state == 'playing':
+            idx = self.viewport.index_at(pos)
+            if idx is not None:
+                self.flip(idx)
 
+profiler = FrameProfiler(FPS)  # F3 toggles the overlay
+input_layer = InputLayer()  # TRUC_XANH_INPUT_STATS=1 prints queue depth and events handled per frame at exit
 game = Game()
+startup.mark('game')
 
 async def main():
     clock = pygame.time.Clock()
+    loop_stats = LoopStats()
+    recorder = start_recording(game, 'main')  # TRUC_XANH_RECORD=<path> logs the session for replay.py
+    can_block = platform.system() != "Emscripten"  # The browser event loop must never be blocked
+
+    def scroll(event):
+        if game.state == 'playing':
+            dy = -event.y * SCROLL_STEP
+            if recorder:
+                recorder.scroll(dy)
+            game.scroll(dy)
+
+    def click(event):
+        if event.button != 1:
+            return  # Pygame also reports every wheel notch as a button 4/5 press
+        audio.latency.click()
+        if recorder:
+            recorder.click(event.pos)
+        game.handle_click(event.pos)
+
+    def repaint(event):
+        compositor.invalidate_all()
+        renderer.mark_all()
+
+    def key(event):
+        if recorder:
+            recorder.key(event.key)
+        game.handle_key(event.key)
+
+    input_layer.on(pygame.MOUSEMOTION, lambda event: game.hover(event.pos))
+    input_layer.on(pygame.MOUSEWHEEL, scroll)
+    input_layer.on(pygame.MOUSEBUTTONDOWN, click)
+    input_layer.on(pygame.KEYDOWN, key)
+    for event_type in REPAINT_EVENTS:
+        input_layer.on(event_type, repaint)
+    input_layer.on_key(pygame.K_F3, profiler.toggle)  # The overlay is not part of the recorded session
     while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return
-            if event.type == pygame.MOUSEMOTION:
-                if game.state == 'menu':
-                    for button in game.buttons:
-                        button.check_hover(event.pos)
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                game.handle_click(event.pos)
-            if event.type == pygame.KEYDOWN:
-                if game.state == 'menu':
-                    if event.key == pygame.K_1:
-                        game.mode = 'single'
-                    elif event.key == pygame.K_2:
-                        game.mode = 'multi'
-                    elif event.key == pygame.K_3:
-                        game.grid_size = 50
-                    elif event.key == pygame.K_4:
-                        game.grid_size = 30
-                    if game.mode and game.grid_size:
-                        game.setup_game(game.mode, game.grid_size)
-                elif game.state == 'game_over' and event.key == pygame.K_r:
-                    game.state = 'menu'
-                    game.mode = None
-                    game.grid_size = None
-
-        game.update()
+        profiler.frame()
+        idle = can_block and game.is_idle()
+        if idle:
+            events = wait_for_events(idle_timeout(game.next_deadline(), loop_stats))
+        else:
+            events = pygame.event.get()
+        profiler.mark('wait')
+        if not input_layer.dispatch(events):
+            return
+        profiler.mark('events')
+        if recorder:
+            recorder.frame(game)
+        fired = game.update()
+        if recorder and fired is not None:
+            recorder.update(fired)  # Logged at the tick the timers fired at, as replay.py will run them
+        audio.latency.frame()  # Notes played after this frame were not caused by its clicks
+        profiler.mark('update')
         game.draw()
-        pygame.display.flip()
+        profiler.mark('draw')
+        profiler.draw(renderer)
+        profiler.mark('overlay')
+        renderer.present()
+        profiler.mark('present')
+        startup.first_frame()
+        loop_stats.frame(idle)
         clock.tick(FPS)
+        profiler.mark('tick')
         await asyncio.sleep(1.0 / FPS)
+        profiler.mark('sleep')
 
 if platform.system() == "Emscripten":
     asyncio.ensure_future(main())
 else:
     if __name__ == "__main__":
-        asyncio.run(main())
\ No newline at end of file
+        asyncio.run(main())
\ No newline at end of file
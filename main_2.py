@@ -1,16 +1,36 @@
 import pygame
-import random
 import asyncio
 import platform
 import os
-
-# Initialize Pygame
-pygame.init()
+import fast_start
+from fast_start import startup, sys_font
+from audio import audio
+from text_cache import text_cache
+from dirty_rects import DirtyRenderer
+from compositor import Compositor
+from frame_profiler import FrameProfiler
+from input_layer import InputLayer, REPAINT_EVENTS
+from idle_loop import LoopStats, idle_timeout, wait_for_events
+from note_assets import NoteAssets
+from web_assets import AssetLoader, asset_url
+from sampler import Sampler
+from hit_index import ButtonIndex
+from replay import start_recording
+from layout import compute_layout, Viewport, SCROLL_KEYS
+from game_logic import MemoryGame, NOTES, FLIP, UNFLIP, MATCH, HINT
+from animation import FrameTables, CardAnimations
+from net_client import NetClient
+
+# Initialize only the pygame modules the game uses
+fast_start.init()
 
 # Screen setup
 WIDTH, HEIGHT = 800, 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
+renderer = DirtyRenderer(screen)
+compositor = Compositor(screen, renderer)
 pygame.display.set_caption("Green Bamboo Music")
+startup.mark('display')
 
 # Colors
 WHITE = (255, 255, 255)
@@ -23,55 +43,52 @@ RED = (255, 0, 0)
 PASTEL_GREEN = (204, 255, 204)  # Light pastel green background
 LIGHT_BROWN = (160, 110, 60) # Light brown for text
 
+# Card animations
+frame_tables = FrameTables(GRAY)  # Flip and match frames per note and card size
+animations = CardAnimations(pygame.time.get_ticks)
+
 # Game settings
 FPS = 60
 CARD_WIDTH, CARD_HEIGHT = 60, 60
 CARD_MARGIN = 10  # Reduced margin to 10 pixels to prevent overflow in 20-pair mode
 ENLARGED_CARD_WIDTH, ENLARGED_CARD_HEIGHT = 90, 90  # Enlarged size for all cards
-
-# Notes from the image
-NOTES = [
-    'A2', 'A3', 'A4', 'A5', 'B2', 'B3', 'B4', 'B5', 'C2', 'C3', 'C4', 'C5', 'C6',
-    'D2', 'D3', 'D4', 'D5', 'E2', 'E3', 'E4', 'E5', 'F2', 'F3', 'F4', 'F5',
-    'G2', 'G3', 'G4', 'G5'
-]
-
-# Load note images from the "images" directory
-NOTE_IMAGES = {}
-ENLARGED_NOTE_IMAGES = {}
-for note in NOTES:
-    image = pygame.image.load(f"images/{note}.png")
-    NOTE_IMAGES[note] = pygame.transform.scale(image, (CARD_WIDTH, CARD_HEIGHT))
-    ENLARGED_NOTE_IMAGES[note] = pygame.transform.scale(image, (ENLARGED_CARD_WIDTH, ENLARGED_CARD_HEIGHT))
+MIN_CARD_SIZE = 40  # Cards shrink to this on big boards, which then scroll
+BOARD_AREA = pygame.Rect(0, 50, WIDTH, HEIGHT - 100)  # Between the scores and the buttons
+MARATHON_CARDS = 400
+SCROLL_STEP = 40  # Pixels per mouse wheel notch
+
+# Note images and sounds are loaded per game from "images" and "piano-mp3".
+# TRUC_XANH_SAMPLER=<semitones> keeps one piano sample every few semitones and pitch-shifts the rest
+# and TRUC_XANH_AUDIO_BUDGET caps the decoded sounds kept in memory (MiB)
+SAMPLER_STEP = int(os.environ.get('TRUC_XANH_SAMPLER', 0))
+SOUND_BUDGET = float(os.environ.get('TRUC_XANH_AUDIO_BUDGET', 8)) * 2**20
+# TRUC_XANH_SERVER=<host>:<port> plays online against server.py instead of hot-seat
+SERVER = os.environ.get('TRUC_XANH_SERVER')
+# The browser build streams the bundle built by `python web_assets.py build` from next to its page
+# while the menu is up; TRUC_XANH_ASSET_URL=<url> does the same on the desktop (see web_assets.py)
+ASSET_URL = asset_url()
+note_assets = NoteAssets((CARD_WIDTH, CARD_HEIGHT), (ENLARGED_CARD_WIDTH, ENLARGED_CARD_HEIGHT),
+                         sampler=Sampler(SAMPLER_STEP, max_sounds=20, compare_notes=NOTES)
+                         if SAMPLER_STEP and not ASSET_URL else None,
+                         max_sound_bytes=int(SOUND_BUDGET))
+
+def use_web_assets(loader):
+    # The atlases are downloaded; sounds keep streaming into the same cache
+    note_assets.load_faces(loader.image_dir)
+    note_assets.sound_dir, note_assets.sound_ext = loader.sound_dir, loader.sound_ext
+
+def use_packaged_assets(loader):
+    # Streaming failed: play on with the images and piano samples shipped with the game
+    note_assets.load_faces("images")
+    note_assets.sound_dir, note_assets.sound_ext = "piano-mp3", ".mp3"
+
+web_assets = AssetLoader(ASSET_URL, NOTES, on_images=use_web_assets,
+                         on_error=use_packaged_assets) if ASSET_URL else None
+startup.mark('assets')
 
 # Font
-font = pygame.font.SysFont('arial', 36)
-small_font = pygame.font.SysFont('arial', 24)  # Smaller font for copyright and sound note
-
-# Load MP3 sounds from the piano-mp3 directory
-NOTE_SOUNDS = {}
-for note in NOTES:
-    sound_path = os.path.join("piano-mp3", f"{note}.mp3")
-    try:
-        NOTE_SOUNDS[note] = pygame.mixer.Sound(sound_path)
-    except pygame.error as e:
-        print(f"Error loading {sound_path}: {e}")
-        NOTE_SOUNDS[note] = pygame.mixer.Sound(os.path.join("piano-mp3", "C4.mp3"))  # Fallback to C4.mp3
-
-class Card:
-    def __init__(self, note, x, y):
-        self.note = note
-        self.rect = pygame.Rect(x, y, ENLARGED_CARD_WIDTH, ENLARGED_CARD_HEIGHT)  # Use enlarged size for all
-        self.enlarged_rect = self.rect  # No need for separate enlarged rect
-        self.is_flipped = False
-        self.is_matched = False
-        self.is_hint = False
-
-    def draw(self, surface):
-        if self.is_matched or self.is_flipped or self.is_hint:
-            surface.blit(ENLARGED_NOTE_IMAGES[self.note], self.rect)  # Use enlarged image
-        else:
-            pygame.draw.rect(surface, GRAY, self.rect)  # Use same rect size, but gray background
+font = sys_font('arial', 36)
+small_font = sys_font('arial', 24)  # Smaller font for copyright and sound note
 
 class Button:
     def __init__(self, text, x, y, width, height, action=None):
@@ -84,9 +101,10 @@ class Button:
         color = HIGHLIGHT if self.hovered else WHITE
         pygame.draw.rect(surface, color, self.rect)
         pygame.draw.rect(surface, BLACK, self.rect, 2)
-        text_surface = font.render(self.text, True, LIGHT_BROWN)  # Use light brown for button text
+        text_surface = text_cache.render(font, self.text, True, LIGHT_BROWN)  # Use light brown for button text
         surface.blit(text_surface, (self.rect.x + (self.rect.width - text_surface.get_width()) // 2,
                                   self.rect.y + (self.rect.height - text_surface.get_height()) // 2))
+        return self.rect
 
     def check_hover(self, pos):
         self.hovered = self.rect.collidepoint(pos)
@@ -95,24 +113,10 @@ class Button:
         if self.action:
             self.action()
 
-class Game:
+class Game(MemoryGame):
     def __init__(self):
-        self.state = 'menu'
-        self.mode = None
+        super().__init__(NOTES, pygame.time.get_ticks, hints=5, hint_duration=3000, listener=self.on_event)
         self.grid_size = None
-        self.cards = []
-        self.flipped_cards = []
-        self.current_player = 1
-        self.scores = {1: 0, 2: 0}
-        self.waiting = False
-        self.wait_start_time = 0
-        self.wait_duration = 1000
-        self.message = ""
-        self.message_timer = 0
-        self.hints_remaining = 5
-        self.hint_timer = 0
-        self.hint_duration = 3000  # 3 seconds
-        self.hint_card = None
         self.buttons = {
             'menu': [
                 Button("Single Player", WIDTH // 2 - 100, 200, 200, 50, lambda: self.set_mode('single')),
@@ -122,7 +126,7 @@ class Game:
                 Button("Exit", WIDTH // 2 - 100, 440, 200, 50, pygame.quit)
             ],
             'playing': [
-                Button("Hint", WIDTH - 150, HEIGHT - 50, 100, 40, self.use_hint),
+                Button("Hint", WIDTH - 150, HEIGHT - 50, 100, 40, self.request_hint),
                 Button("Back", 20, HEIGHT - 50, 100, 40, self.back_to_menu),
                 Button("Exit", 140, HEIGHT - 50, 100, 40, pygame.quit)  # Moved to top-right corner
             ],
@@ -131,6 +135,22 @@ class Game:
                 Button("Exit", WIDTH // 2 - 100, HEIGHT // 2 + 160, 200, 50, pygame.quit)
             ]
         }
+        self.button_index = {state: ButtonIndex(buttons) for state, buttons in self.buttons.items()}
+        self.menu_keys = {  # Keyboard shortcuts for the menu buttons
+            pygame.K_1: lambda: self.set_mode('single'),
+            pygame.K_2: lambda: self.set_mode('multi'),
+            pygame.K_3: lambda: self.set_grid_size(20),
+            pygame.K_4: lambda: self.set_grid_size(40),
+            pygame.K_5: lambda: self.set_grid_size(MARATHON_CARDS)
+        }
+        self.card_index = None
+        self.viewport = None
+        self.remote = None  # NetClient when playing online
+        self.painted = (None, None)  # Board and card flags the board layer was last painted with
+        self.loading = None  # Notes of a dealt board still waiting for their streamed assets
+        compositor.add('background', self.paint_background, alpha=False)
+        compositor.add('board', self.paint_board)
+        compositor.add('hud', self.paint_hud)
 
     def set_mode(self, mode):
         self.mode = mode
@@ -143,133 +163,233 @@ class Game:
             self.setup_game(self.mode, self.grid_size)
 
     def setup_game(self, mode, grid_size):
-        self.mode = mode
         self.grid_size = grid_size
-        self.cards = []
-        self.flipped_cards = []
-        self.scores = {1: 0, 2: 0}
-        self.current_player = 1
-        self.hints_remaining = 5
+        if self.remote:
+            # The server deals once the session is full; its 'start' calls layout_board
+            note_assets.prepare([])
+            self.remote.join(grid_size // 2, 2 if mode == 'multi' else 1)
+            return
+        selected_notes = self.deal(mode, grid_size // 2, reuse=grid_size == MARATHON_CARDS)
+        if web_assets and not web_assets.error and not web_assets.ready(selected_notes):
+            # Stay on the menu until this board's notes have streamed in; update() starts it
+            web_assets.prioritize(selected_notes)
+            self.state = 'menu'
+            self.loading = selected_notes
+            return
+        self.start_board(selected_notes)
+
+    def start_board(self, selected_notes):
+        self.loading = None
         self.state = 'playing'
+        note_assets.prepare(selected_notes)
+        self.layout_board()
+        card_size = (self.card_index.card_width, self.card_index.card_height)
+        frame_tables.prepare(selected_notes, lambda note: note_assets.face(note, card_size), card_size)
+        if web_assets:
+            web_assets.mark('interactive')
+
+    def layout_board(self):
+        # Cards use the enlarged size (90x90 pixels) with reduced margin, shrinking on big
+        # boards; boards too big for the window scroll
+        self.viewport = Viewport(compute_layout(len(self.board), BOARD_AREA, ENLARGED_CARD_WIDTH, MIN_CARD_SIZE,
+                                                CARD_MARGIN))
+        self.card_index = self.viewport.index
+        animations.clear()
+
+    def scroll(self, dy):
+        self.viewport.scroll_by(dy)  # The board layer is keyed on the scroll offset
+
+    def on_event(self, kind, data):
+        if kind == FLIP:
+            audio.play_note(note_assets.sound(self.board.note(data)))
+        self.animate(kind, data)
+
+    def animate(self, kind, data):
+        # Flips, hints, unflips and matches play frames from the precomputed tables
+        if kind in (FLIP, HINT):
+            cards, table = [data], frame_tables.flip
+        elif kind == UNFLIP:
+            cards, table = data, frame_tables.unflip
+        elif kind == MATCH:
+            cards, table = data, frame_tables.match
+        else:
+            return
+        card_size = (self.card_index.card_width, self.card_index.card_height)
+        for idx in cards:
+            note = self.board.note(idx)
+            animations.start(idx, table(note, note_assets.face(note, card_size), card_size))
 
-        pairs = grid_size // 2
-        selected_notes = random.sample(NOTES, pairs)
-        card_notes = selected_notes * 2
-        random.shuffle(card_notes)
-
-        # Adjusted grid to use enlarged card size (90x90 pixels) with reduced margin
-        rows = 4 if grid_size == 20 else 5
-        cols = grid_size // rows
-        card_spacing = ENLARGED_CARD_WIDTH + CARD_MARGIN  # Use 90 + 10 = 100 pixels spacing
-        start_x = (WIDTH - (cols * card_spacing - CARD_MARGIN)) // 2
-        start_y = (HEIGHT - (rows * card_spacing - CARD_MARGIN)) // 2
-
-        for i in range(rows):
-            for j in range(cols):
-                idx = i * cols + j
-                if idx < len(card_notes):
-                    x = start_x + j * card_spacing
-                    y = start_y + i * card_spacing
-                    self.cards.append(Card(card_notes[idx], x, y))
+    def update(self):
+        if self.loading and (web_assets.error or web_assets.ready(self.loading)):
+            self.start_board(self.loading)  # After a failed stream it plays with the packaged notes
+        return super().update()
+
+    def is_idle(self):
+        # Frames keep running while assets stream in, for the loader task and the progress bar,
+        # and while a board waits on them, so update() starts it even once the stream has failed
+        return (super().is_idle() and animations.is_idle() and not self.loading
+                and not (web_assets and web_assets.busy()))
+
+    def draw_card(self, surface, idx):
+        note = self.board.note(idx)
+        rect = self.card_index.card_rect(idx)
+        frame = animations.frame(idx)
+        if frame:
+            image, (dx, dy) = frame
+            surface.blit(image, (rect[0] + dx, rect[1] + dy))
+        elif self.board.is_face_up(idx):
+            surface.blit(note_assets.face(note, rect[2:]), rect)  # Use enlarged image
+        else:
+            pygame.draw.rect(surface, GRAY, rect)  # Use same rect size, but gray background
 
-    def draw(self):
-        screen.fill(PASTEL_GREEN)  # Use pastel green background
+    def paint_background(self, surface, area):
+        surface.fill(PASTEL_GREEN)  # Use pastel green background
+        if self.state == 'menu':
+            title = text_cache.render(font, "Green Bamboo Music", True, LIGHT_BROWN)  # Use light brown text
+            surface.blit(title, (WIDTH // 2 - title.get_width() // 2, 100))
+            instruction = text_cache.render(font, "Select mode and grid size", True, LIGHT_BROWN)
+            surface.blit(instruction, (WIDTH // 2 - instruction.get_width() // 2, 150))
+            copyright = text_cache.render(small_font, "Game idea, design and development: Nhat Le and Dung T.M Phung", True, LIGHT_BROWN)
+            surface.blit(copyright, (WIDTH // 2 - copyright.get_width() // 2, HEIGHT - 50))
+        elif self.state == 'playing':
+            sound_note = text_cache.render(small_font, "Turn on sound for the best experience", True, LIGHT_BROWN)
+            surface.blit(sound_note, (WIDTH // 2 - sound_note.get_width() // 2, HEIGHT - 30))  # At the bottom
+
+    def paint_board(self, surface, area):
+        band = area.clip(BOARD_AREA)  # Only cards in view are drawn, and never over the scores
+        surface.set_clip(band)
+        for idx in self.card_index.indices_between(band.top, band.bottom):
+            if band.colliderect(self.card_index.card_rect(idx)):
+                self.draw_card(surface, idx)
+        surface.set_clip(area)
+        scrollbar = self.viewport.scrollbar()
+        if scrollbar:
+            pygame.draw.rect(surface, LIGHT_BROWN, scrollbar)
+        return [BOARD_AREA]
+
+    def paint_progress(self, surface):
+        # Streamed assets above the title: how much has arrived, and whether a board waits on it
+        if web_assets.error:
+            text = "Could not load the notes, using the built-in ones"
+        elif self.loading:
+            text = f"Loading this board's notes... {int(web_assets.progress() * 100)}%"
+        else:
+            text = f"Loading notes {int(web_assets.progress() * 100)}%"
+        label = text_cache.render(small_font, text, True, LIGHT_BROWN)
+        bar = pygame.Rect(WIDTH // 2 - 150, 55, 300, 10)
+        pygame.draw.rect(surface, WHITE, bar)
+        pygame.draw.rect(surface, LIGHT_BROWN, (bar.x, bar.y, round(bar.width * web_assets.progress()), bar.height))
+        pygame.draw.rect(surface, BLACK, bar, 1)
+        return [surface.blit(label, (WIDTH // 2 - label.get_width() // 2, 20)), bar]
+
+    def paint_hud(self, surface, area):
+        drawn = [button.draw(surface) for button in self.buttons[self.state]]
         if self.state == 'menu':
-            title = font.render("Green Bamboo Music", True, LIGHT_BROWN)  # Use light brown text
-            screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 100))
-            instruction = font.render("Select mode and grid size", True, LIGHT_BROWN)
-            screen.blit(instruction, (WIDTH // 2 - instruction.get_width() // 2, 150))
-            copyright = small_font.render("Game idea, design and development: Nhat Le and Dung T.M Phung", True, LIGHT_BROWN)
-            screen.blit(copyright, (WIDTH // 2 - copyright.get_width() // 2, HEIGHT - 50))
-            for button in self.buttons['menu']:
-                button.draw(screen)
+            if web_assets and (web_assets.busy() or web_assets.error):
+                drawn.extend(self.paint_progress(surface))
             if self.mode:
-                mode_text = font.render(f"Mode: {'Single' if self.mode == 'single' else 'Multi'}", True, LIGHT_BROWN)
-                screen.blit(mode_text, (WIDTH // 2 - mode_text.get_width() // 2, 450))
+                mode_text = text_cache.render(font, f"Mode: {'Single' if self.mode == 'single' else 'Multi'}", True, LIGHT_BROWN)
+                drawn.append(surface.blit(mode_text, (WIDTH // 2 - mode_text.get_width() // 2, 450)))
             if self.grid_size:
-                grid_text = font.render(f"Grid: {self.grid_size // 2} Pairs", True, LIGHT_BROWN)
-                screen.blit(grid_text, (WIDTH // 2 - grid_text.get_width() // 2, 500))
+                grid_text = text_cache.render(font, f"Grid: {self.grid_size // 2} Pairs", True, LIGHT_BROWN)
+                drawn.append(surface.blit(grid_text, (WIDTH // 2 - grid_text.get_width() // 2, 500)))
+            if self.remote and self.remote.room:
+                wait_text = text_cache.render(small_font, "Waiting for another player...", True, LIGHT_BROWN)
+                drawn.append(surface.blit(wait_text, (WIDTH // 2 - wait_text.get_width() // 2, HEIGHT - 80)))
+            if self.message:  # E.g. the other player left or the server could not be reached
+                msg_surface = text_cache.render(small_font, self.message, True, LIGHT_BROWN)
+                drawn.append(surface.blit(msg_surface, (WIDTH // 2 - msg_surface.get_width() // 2, HEIGHT - 60)))
         elif self.state == 'playing':
-            for card in self.cards:
-                card.draw(screen)
-            score_text = font.render(f"Player 1: {self.scores[1]}", True, LIGHT_BROWN)
-            screen.blit(score_text, (10, 10))
+            score_text = text_cache.render(font, f"Player 1: {self.scores[1]}", True, LIGHT_BROWN)
+            drawn.append(surface.blit(score_text, (10, 10)))
             if self.mode == 'multi':
-                score_text2 = font.render(f"Player 2: {self.scores[2]}", True, LIGHT_BROWN)
-                screen.blit(score_text2, (WIDTH - score_text2.get_width() - 10, 10))
-                player_text = font.render(f"Turn: Player {self.current_player}", True, LIGHT_BROWN)
-                screen.blit(player_text, (WIDTH // 2 - player_text.get_width() // 2, 10))
+                score_text2 = text_cache.render(font, f"Player 2: {self.scores[2]}", True, LIGHT_BROWN)
+                drawn.append(surface.blit(score_text2, (WIDTH - score_text2.get_width() - 10, 10)))
+                player_text = text_cache.render(font, f"Turn: Player {self.current_player}", True, LIGHT_BROWN)
+                drawn.append(surface.blit(player_text, (WIDTH // 2 - player_text.get_width() // 2, 10)))
             if self.message:
-                msg_surface = small_font.render(self.message, True, LIGHT_BROWN)
-                screen.blit(msg_surface, (WIDTH // 2 - msg_surface.get_width() // 2, HEIGHT - 60))
-
-
-            sound_note = small_font.render("Turn on sound for the best experience", True, LIGHT_BROWN)
-            screen.blit(sound_note, (WIDTH // 2 - sound_note.get_width() // 2, HEIGHT - 30))  # At the bottom
-            for button in self.buttons['playing']:
-                button.draw(screen)
-            # hints_text = font.render(f"Hints: {self.hints_remaining}", True, LIGHT_BROWN)
-            # screen.blit(hints_text, (WIDTH - 150, HEIGHT - 90))
+                msg_surface = text_cache.render(small_font, self.message, True, LIGHT_BROWN)
+                drawn.append(surface.blit(msg_surface, (WIDTH // 2 - msg_surface.get_width() // 2, HEIGHT - 60)))
+            # hints_text = text_cache.render(font, f"Hints: {self.hints_remaining}", True, LIGHT_BROWN)
+            # drawn.append(surface.blit(hints_text, (WIDTH - 150, HEIGHT - 90)))
         elif self.state == 'game_over':
             winner = 1 if self.scores[1] > self.scores[2] else 2 if self.scores[2] > self.scores[1] else 0
             if self.mode == 'single':
-                text = font.render(f"Congratulations! Score: {self.scores[1]}", True, LIGHT_BROWN)
+                text = text_cache.render(font, f"Congratulations! Score: {self.scores[1]}", True, LIGHT_BROWN)
             else:
-                text = font.render(f"Congratulations! Player {winner} Wins!" if winner else "Congratulations! Tie!", True, LIGHT_BROWN)
-            screen.blit(text, (WIDTH // 2 - text.get_width() // 2, HEIGHT // 2))
-            for button in self.buttons['game_over']:
-                button.draw(screen)
+                text = text_cache.render(font, f"Congratulations! Player {winner} Wins!" if winner else "Congratulations! Tie!", True, LIGHT_BROWN)
+            drawn.append(surface.blit(text, (WIDTH // 2 - text.get_width() // 2, HEIGHT // 2)))
+        return drawn
 
-    def handle_click(self, pos):
+    def draw(self):
+        # Each layer is repainted only when its key changes; flipped cards repaint just their rects
+        compositor.update('background', self.state)
+        if self.state == 'playing':
+            compositor.update('board', (self.board, self.viewport.scroll))
+            self.invalidate_cards()
+            for idx, bounds in animations.advance():
+                x, y = self.card_index.card_rect(idx)[:2]
+                compositor.invalidate('board', bounds.move(x, y))
+        else:
+            animations.clear()  # Nothing left to animate once the board is gone
+            compositor.update('board', None)
+        compositor.update('hud', (self.state, self.mode, self.grid_size, self.scores[1], self.scores[2],
+                                  self.current_player, self.message, self.button_index[self.state].hovered,
+                                  bool(self.remote and self.remote.room), self.loading_key()))
+        compositor.compose()
+
+    def loading_key(self):
+        if not web_assets:
+            return None
+        return web_assets.busy(), int(web_assets.progress() * 100), bool(web_assets.error), bool(self.loading)
+
+    def invalidate_cards(self):
+        # Repaint just the visible cards whose flags changed since they were painted
+        if self.painted[0] is not self.board:
+            self.painted = (self.board, bytearray(self.board.flags))
+        flags, painted = self.board.flags, self.painted[1]
+        if flags != painted:
+            for idx in self.viewport.visible_indices():
+                if flags[idx] != painted[idx]:
+                    compositor.invalidate('board', self.card_index.card_rect(idx))
+            painted[:] = flags
+
+    def handle_key(self, key):
         if self.state == 'menu':
-            for button in self.buttons['menu']:
-                if button.rect.collidepoint(pos):
-                    button.on_click()
+            if key in self.menu_keys:
+                self.menu_keys[key]()
+        elif self.state == 'playing' and key in SCROLL_KEYS:
+            self.scroll(SCROLL_KEYS[key] * self.viewport.layout.pitch)
+        elif self.state == 'game_over' and key == pygame.K_r:
+            self.restart_game()
+
+    def hover(self, pos):
+        if self.state in self.button_index:
+            self.button_index[self.state].hover(pos)
+
+    def handle_click(self, pos):
+        button = self.button_index[self.state].button_at(pos) if self.state in self.button_index else None
+        if button:
+            button.on_click()
         elif self.state == 'playing':
-            for button in self.buttons['playing']:
-                if button.rect.collidepoint(pos):
-                    button.on_click()
-            if not self.waiting and len(self.flipped_cards) < 2:
-                for card in self.cards:
-                    if card.rect.collidepoint(pos) and not card.is_flipped and not card.is_matched:
-                        card.is_flipped = True
-                        NOTE_SOUNDS[card.note].play()
-                        self.flipped_cards.append(card)
-                        if len(self.flipped_cards) == 2:
-                            self.check_match()
-        elif self.state == 'game_over':
-            for button in self.buttons['game_over']:
-                if button.rect.collidepoint(pos):
-                    button.on_click()
-
-    def check_match(self):
-        card1, card2 = self.flipped_cards
-        if card1.note == card2.note:
-            card1.is_matched = card2.is_matched = True
-            self.scores[self.current_player] += 1
-            self.flipped_cards = []
-            self.message = "Match!"
-            self.message_timer = pygame.time.get_ticks()
-            if all(card.is_matched for card in self.cards):
-                self.state = 'game_over'
+            idx = self.viewport.index_at(pos)
+            if idx is not None:
+                if self.remote:
+                    self.remote.flip(idx)
+                else:
+                    self.flip(idx)
+
+    def request_hint(self):
+        if self.remote:
+            self.remote.hint()
         else:
-            self.waiting = True
-            self.wait_start_time = pygame.time.get_ticks()
-            self.message = "No Match!"
-            self.message_timer = pygame.time.get_ticks()
-
-    def use_hint(self):
-        if self.hints_remaining > 0 and len(self.flipped_cards) == 1:
-            selected_card = self.flipped_cards[0]
-            for card in self.cards:
-                if card.note == selected_card.note and card != selected_card and not card.is_matched:
-                    card.is_hint = True
-                    self.hint_card = card
-                    self.hint_timer = pygame.time.get_ticks()
-                    self.hints_remaining -= 1
-                    break
+            self.use_hint()
 
     def back_to_menu(self):
+        if self.remote and self.remote.room:
+            self.remote.leave()
+        self.cancel_timers()  # The abandoned game's unflip, message and hint never fire
+        self.message = ""
         self.state = 'menu'
         self.mode = None
         self.grid_size = None
@@ -277,61 +397,93 @@ class Game:
     def restart_game(self):
         self.setup_game(self.mode, self.grid_size)
 
-    def update(self):
-        if self.waiting and pygame.time.get_ticks() - self.wait_start_time > self.wait_duration:
-            for card in self.flipped_cards:
-                card.is_flipped = False
-            self.flipped_cards = []
-            self.waiting = False
-            if self.mode == 'multi':
-                self.current_player = 2 if self.current_player == 1 else 1
-        if self.message and pygame.time.get_ticks() - self.message_timer > 1000:
-            self.message = ""
-        if self.hint_card and pygame.time.get_ticks() - self.hint_timer > self.hint_duration:
-            self.hint_card.is_hint = False
-            self.hint_card = None
-
+profiler = FrameProfiler(FPS)  # F3 toggles the overlay
+input_layer = InputLayer()  # TRUC_XANH_INPUT_STATS=1 prints queue depth and events handled per frame at exit
 game = Game()
+startup.mark('game')
 
 async def main():
     clock = pygame.time.Clock()
+    loop_stats = LoopStats()
+    recorder = start_recording(game, 'main_2')  # TRUC_XANH_RECORD=<path> logs the session for replay.py
+    if SERVER:
+        host, port = SERVER.rsplit(':', 1)
+        game.remote = NetClient(game, on_start=game.layout_board)
+        try:
+            await game.remote.connect(host, int(port))
+        except OSError as e:
+            print(f"Could not connect to {SERVER}: {e}")
+            game.remote = None
+            game.set_message("Server unreachable, playing offline")
+    if web_assets:
+        web_assets.start()
+    # The browser event loop must never be blocked, nor the one reading from the server
+    can_block = platform.system() != "Emscripten" and not game.remote
+
+    def scroll(event):
+        if game.state == 'playing':
+            dy = -event.y * SCROLL_STEP
+            if recorder:
+                recorder.scroll(dy)
+            game.scroll(dy)
+
+    def click(event):
+        if event.button != 1:
+            return  # Pygame also reports every wheel notch as a button 4/5 press
+        audio.latency.click()
+        if recorder:
+            recorder.click(event.pos)
+        game.handle_click(event.pos)
+
+    def repaint(event):
+        compositor.invalidate_all()
+        renderer.mark_all()
+
+    def key(event):
+        if recorder:
+            recorder.key(event.key)
+        game.handle_key(event.key)
+
+    input_layer.on(pygame.MOUSEMOTION, lambda event: game.hover(event.pos))
+    input_layer.on(pygame.MOUSEWHEEL, scroll)
+    input_layer.on(pygame.MOUSEBUTTONDOWN, click)
+    input_layer.on(pygame.KEYDOWN, key)
+    for event_type in REPAINT_EVENTS:
+        input_layer.on(event_type, repaint)
+    input_layer.on_key(pygame.K_F3, profiler.toggle)  # The overlay is not part of the recorded session
     while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return
-            if event.type == pygame.MOUSEMOTION:
-                if game.state == 'menu':
-                    for button in game.buttons['menu']:
-                        button.check_hover(event.pos)
-                elif game.state == 'playing':
-                    for button in game.buttons['playing']:
-                        button.check_hover(event.pos)
-                elif game.state == 'game_over':
-                    for button in game.buttons['game_over']:
-                        button.check_hover(event.pos)
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                game.handle_click(event.pos)
-            if event.type == pygame.KEYDOWN:
-                if game.state == 'menu':
-                    if event.key == pygame.K_1:
-                        game.set_mode('single')
-                    elif event.key == pygame.K_2:
-                        game.set_mode('multi')
-                    elif event.key == pygame.K_3:
-                        game.set_grid_size(20)
-                    elif event.key == pygame.K_4:
-                        game.set_grid_size(40)
-                elif game.state == 'game_over' and event.key == pygame.K_r:
-                    game.restart_game()
-
-        game.update()
+        profiler.frame()
+        idle = can_block and game.is_idle()
+        if idle:
+            events = wait_for_events(idle_timeout(game.next_deadline(), loop_stats))
+        else:
+            events = pygame.event.get()
+        profiler.mark('wait')
+        if not input_layer.dispatch(events):
+            return
+        profiler.mark('events')
+        if recorder:
+            recorder.frame(game)
+        fired = game.update()
+        if recorder and fired is not None:
+            recorder.update(fired)  # Logged at the tick the timers fired at, as replay.py will run them
+        audio.latency.frame()  # Notes played after this frame were not caused by its clicks
+        profiler.mark('update')
         game.draw()
-        pygame.display.flip()
+        profiler.mark('draw')
+        profiler.draw(renderer)
+        profiler.mark('overlay')
+        renderer.present()
+        profiler.mark('present')
+        startup.first_frame()
+        loop_stats.frame(idle)
         clock.tick(FPS)
+        profiler.mark('tick')
         await asyncio.sleep(1.0 / FPS)
+        profiler.mark('sleep')
 
 if platform.system() == "Emscripten":
     asyncio.ensure_future(main())
 else:
     if __name__ == "__main__":
-        asyncio.run(main())
\ No newline at end of file
+        asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+from collections import deque
+from board import Board
+from game_logic import FLIP, UNFLIP, MATCH
+from server import encode
+
+# Board of an online game. Notes are unknown until the server reveals them, so
+# every card starts as '?' and reveal() gives it its own note id; positions
+# are not tracked since pairing is the server's business.
+class RemoteBoard(Board):
+    def __init__(self, count):
+        super().__init__(['?'] * count)
+
+    def reveal(self, idx, note):
+        if note not in self.note_names:
+            self.note_names.append(note)
+        self.notes[idx] = self.note_names.index(note)
+
+# Client side of server.py. It mirrors the server's diffs into a MemoryGame
+# (the pygame Game or a bare one for bots) so drawing, messages and hint
+# timeouts work as offline, and re-emits flips and hints to the game's listener
+# so notes still play. Nothing is decided locally: flip() only sends a request.
+class NetClient:
+    def __init__(self, game, on_start=None):
+        self.game = game
+        self.on_start = on_start
+        self.reader = None
+        self.writer = None
+        self.room = None
+        self.seat = None
+        self.players = 1
+        self.task = None
+        self.pending_flip = None  # (idx, send time) of the last flip request
+        self.round_trips = deque(maxlen=1000)  # Flip request to flip diff, ms
+        self.errors = 0
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.task = asyncio.ensure_future(self.run())
+
+    def send(self, message):
+        if self.writer and not self.writer.is_closing():
+            self.writer.write(encode(message))
+
+    def join(self, pairs, players=2, room=None):
+        message = {'op': 'join', 'pairs': pairs, 'players': players}
+        if room is not None:
+            message['room'] = room
+        self.players = players
+        self.send(message)
+
+    def my_turn(self):
+        return self.players == 1 or self.game.current_player == self.seat
+
+    def flip(self, idx):
+        if not self.my_turn() or not self.game.can_flip(idx) or self.pending_flip:
+            return False
+        self.pending_flip = (idx, time.perf_counter())
+        self.send({'op': 'flip', 'i': idx})
+        return True
+
+    def hint(self):
+        if self.my_turn():
+            self.send({'op': 'hint'})
+
+    def leave(self):
+        self.send({'op': 'leave'})
+        self.room = self.seat = None
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+    async def run(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                self.apply(json.loads(line))
+        except ConnectionError:
+            pass
+        self.game.state = 'menu'
+        self.room = self.seat = None
+
+    def apply(self, message):
+        game = self.game
+        kind = message['t']
+        if kind == 'f':
+            idx = message['i']
+            game.board.reveal(idx, message['n'])
+            game.board.flip(idx)
+            game.flipped_cards.append(idx)
+            if self.pending_flip and self.pending_flip[0] == idx:
+                self.round_trips.append((time.perf_counter() - self.pending_flip[1]) * 1000)
+                self.pending_flip = None
+            game.emit(FLIP, idx)
+        elif kind == 'u':
+            for idx in message['i']:
+                game.board.unflip(idx)
+            game.flipped_cards = []
+            game.emit(UNFLIP, message['i'])
+        elif kind == 'm':
+            game.board.match(*message['i'])
+            game.scores = {1: message['s'][0], 2: message['s'][1]}
+            game.flipped_cards = []
+            game.set_message("Match!")
+            game.emit(MATCH, message['i'])
+        elif kind == 'x':
+            game.set_message("No Match!")
+        elif kind == 'h':
+            idx = message['i']
+            game.board.reveal(idx, message['n'])
+            game.hints_remaining -= 1
+            game.show_hint(idx)
+        elif kind == 'p':
+            game.current_player = message['p']
+        elif kind == 'o':
+            game.state = 'game_over'
+        elif kind == 'start':
+            game.cancel_timers()
+            game.mode = 'multi' if self.players == 2 else 'single'
+            game.board = RemoteBoard(message['n'])
+            game.flipped_cards = []
+            game.hint_card = None
+            game.waiting = False
+            game.message = ""
+            game.scores = {1: 0, 2: 0}
+            game.current_player = 1
+            game.hints_remaining = message['hints']
+            game.state = 'playing'
+            self.pending_flip = None
+            if self.on_start:
+                self.on_start()
+        elif kind == 'joined':
+            self.room, self.seat = message['room'], message['seat']
+        elif kind == 'left':
+            game.state = 'menu'
+            game.set_message("The other player left")
+            self.room = self.seat = None
+        elif kind == 'error':
+            self.errors += 1
+            self.pending_flip = None
@@ -0,0 +1,126 @@
+import atexit
+import os
+from collections import OrderedDict
+import pygame
+from texture_atlas import load_atlas
+import pcm_cache
+from sound_budget import SoundPrep, SoundBudget
+from synth_bank import key_number
+
+# Loads note images and sounds only when a game needs them. Images live in a
+# bounded LRU cache shared across games where notes of the running game are never
+# evicted; sounds are trimmed by `prep` and kept under a byte budget, dropping
+# the least recently played first. With a sampler.Sampler, sounds are
+# pitch-shifted from its anchor samples instead. TRUC_XANH_AUDIO_STATS=1 prints
+# what trimming saved per note at exit
+class NoteAssets:
+    def __init__(self, card_size, enlarged_size, max_notes=20, image_dir="images",
+                 sound_dir="piano-mp3", fallback_note="C4", sampler=None, prep=None,
+                 max_sound_bytes=8 * 2**20, sound_ext=".mp3"):
+        self.card_size = card_size
+        self.enlarged_size = enlarged_size
+        self.max_notes = max_notes
+        self.image_dir = image_dir
+        self.sound_dir = sound_dir
+        self.sound_ext = sound_ext
+        self.fallback_note = fallback_note
+        self.sampler = sampler
+        self.prep = prep or SoundPrep()
+        if not sampler and os.environ.get('TRUC_XANH_AUDIO_STATS'):
+            atexit.register(lambda: print(self.prep.report()))
+        self.sounds = SoundBudget(max_sound_bytes)
+        self.entries = OrderedDict()  # note -> (image, enlarged image)
+        self.scaled = {}  # (note, size) -> enlarged image scaled for the current board
+        self.pinned = set()
+        self.loads = 0
+        self.evictions = 0
+        self.load_faces()
+
+    def load_faces(self, image_dir=None):
+        # (Re)read the atlases, e.g. once the web build has downloaded them
+        self.image_dir = image_dir or self.image_dir
+        self.faces = load_atlas(self.card_size, self.image_dir) or {}
+        self.enlarged_faces = load_atlas(self.enlarged_size, self.image_dir) or {}
+        self.entries.clear()
+        self.scaled = {}
+
+    def load_sound(self, note):
+        if self.sampler:
+            return self.sampler.sound(key_number(note))
+        sound_path = os.path.join(self.sound_dir, note + self.sound_ext)
+        try:
+            return pcm_cache.load_sound(sound_path, prep=self.prep)
+        except pygame.error as e:
+            print(f"Error loading {sound_path}: {e}")
+            return pcm_cache.load_sound(os.path.join(self.sound_dir, self.fallback_note + self.sound_ext), prep=self.prep)
+
+    def load_image(self, note, size):
+        image = pygame.transform.scale(pygame.image.load(os.path.join(self.image_dir, f"{note}.png")), size)
+        return image.convert_alpha() if pygame.display.get_surface() else image
+
+    def load(self, note):
+        # Faces come from the prebuilt atlas when available, otherwise from the single PNG
+        self.loads += 1
+        image = self.faces.get(note) or self.load_image(note, self.card_size)
+        enlarged_image = self.enlarged_faces.get(note) or self.load_image(note, self.enlarged_size)
+        return image, enlarged_image
+
+    def get(self, note):
+        entry = self.entries.get(note)
+        if entry is None:
+            entry = self.entries[note] = self.load(note)
+            self.evict()
+        else:
+            self.entries.move_to_end(note)
+        return entry
+
+    def evict(self):
+        for note in list(self.entries):
+            if len(self.entries) <= self.max_notes:
+                break
+            if note not in self.pinned:
+                del self.entries[note]
+                self.evictions += 1
+
+    def prepare(self, notes):
+        # Pin the notes of a new game, load any that are not cached yet and
+        # preload their sounds while they fit in the budget
+        self.pinned = set(notes)
+        self.scaled = {}
+        mixer = pygame.mixer.get_init()
+        if self.sampler and mixer:
+            self.sampler.prepare([key_number(note) for note in notes if note not in self.sounds.sounds])
+        for note in notes:
+            self.get(note)
+            if mixer and self.sounds.bytes < self.sounds.max_bytes:
+                self.sounds.get(note, lambda: self.load_sound(note))
+        self.evict()
+
+    def image(self, note):
+        return self.get(note)[0]
+
+    def enlarged_image(self, note):
+        return self.get(note)[1]
+
+    def face(self, note, size):
+        # Face at any card size, for boards laid out smaller than the atlas sizes
+        if size == self.enlarged_size:
+            return self.enlarged_image(note)
+        if size == self.card_size:
+            return self.image(note)
+        image = self.scaled.get((note, size))
+        if image is None:
+            image = self.scaled[(note, size)] = pygame.transform.smoothscale(self.enlarged_image(note), size)
+        return image
+
+    def sound(self, note):
+        # Only called to play the note, so this is also what orders evictions; None without a mixer
+        if not pygame.mixer.get_init():
+            return None
+        sound = self.sounds.get(note, lambda: self.load_sound(note))
+        self.sounds.played(note)
+        return sound
+
+    def stats(self):
+        return {'cached': len(self.entries), 'loads': self.loads, 'evictions': self.evictions,
+                'sounds': self.sounds.stats()}
@@ -0,0 +1,77 @@
+import glob
+import hashlib
+import mmap
+import os
+import pygame
+
+# Decoded PCM for the piano samples in the mixer's exact format, keyed by a hash
+# of the MP3 contents, the mixer settings and any sound_budget.SoundPrep applied
+# after decoding, so a change to any of them re-decodes. File names carry a tag
+# of the prep as well (`raw` without one), so entries of the same note written
+# with and without a prep (the game's trimmed notes, the Sampler's anchors)
+# live side by side instead of replacing each other. Prepped entries keep the
+# untrimmed size in a `.src` file next to them, so SoundPrep's savings report
+# is filled from a warm cache too.
+CACHE_DIR = os.path.join(".cache", "pcm")
+
+def cache_path(sound_path, cache_dir=CACHE_DIR, prep=None):
+    frequency, size, channels = pygame.mixer.get_init()
+    digest = hashlib.sha1()
+    with open(sound_path, "rb") as f:
+        digest.update(f.read())
+    digest.update(f"{frequency}:{size}:{channels}".encode())
+    if prep is not None:
+        digest.update(prep.key().encode())
+    name = os.path.splitext(os.path.basename(sound_path))[0]
+    tag = hashlib.sha1(prep.key().encode()).hexdigest()[:8] if prep is not None else "raw"
+    return os.path.join(cache_dir, f"{name}-{tag}-{digest.hexdigest()[:16]}.pcm")
+
+def map_sound(path):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return pygame.mixer.Sound(buffer=buffer)
+
+def source_bytes(path):
+    try:
+        with open(path + ".src") as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+def store(path, sound, source_size=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    prefix = os.path.basename(path).rsplit("-", 1)[0]  # Note and prep tag: only this prep's stale entries go
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f"{prefix}-*.pcm*")):
+        os.remove(stale)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(sound.get_raw())
+    os.replace(tmp_path, path)  # Never leave a half-written cache entry behind
+    if source_size is not None:
+        with open(path + ".src", "w") as f:
+            f.write(str(source_size))
+
+def load_sound(sound_path, cache_dir=CACHE_DIR, prep=None):
+    # Raises pygame.error/FileNotFoundError like pygame.mixer.Sound when the sample cannot be read
+    try:
+        path = cache_path(sound_path, cache_dir, prep)
+    except FileNotFoundError:
+        raise pygame.error(f"No file '{sound_path}' found")
+    name = os.path.splitext(os.path.basename(sound_path))[0]
+    try:
+        sound = map_sound(path)
+    except (OSError, ValueError):
+        pass  # Not cached yet (or empty/unreadable entry): decode once and store it
+    else:
+        before = source_bytes(path) if prep is not None else None
+        if before is not None:
+            prep.saved[name] = (before, os.path.getsize(path))
+        return sound
+    sound = pygame.mixer.Sound(sound_path)
+    if prep is not None:
+        sound = prep.apply(sound, name)
+    try:
+        store(path, sound, prep.saved[name][0] if prep is not None else None)
+    except OSError as e:
+        print(f"Could not cache {sound_path}: {e}")
+    return sound
@@ -0,0 +1,170 @@
+import argparse
+import atexit
+import importlib
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+
+# Session recording and replay. TRUC_XANH_RECORD=<path> seeds the game's RNG
+# and appends everything that can change the game to a small binary log:
+#   header  b'TXRP', version, seed, the game's wait/message/hint durations (ms),
+#           module name
+#   'C' tick x y      click            'K' tick key     key press
+#   'S' tick dy       scroll (pixels)  'U' tick         update() that fired timers
+#   'G' tick mode cards crc            a new deal, to check the replay against
+# Ticks are the game clock (pygame ticks). Records go through a 64 KiB file
+# buffer, so recording costs a struct.pack per input, not a write per frame.
+#
+# Replaying imports the recorded module and drives its Game through the same
+# handle_click / handle_key / scroll / update calls on a virtual clock, either
+# as fast as possible without drawing or in real time with the window.
+MAGIC = b'TXRP'
+VERSION = 2
+HEADER = struct.Struct('<4sBQIIIB')
+RECORDS = {
+    b'C': struct.Struct('<Ihh'),
+    b'K': struct.Struct('<II'),
+    b'S': struct.Struct('<Ih'),
+    b'U': struct.Struct('<I'),
+    b'G': struct.Struct('<IBHI'),
+}
+MODES = ('single', 'multi')
+
+def board_crc(board):
+    return zlib.crc32(" ".join(board.note(idx) for idx in range(len(board))).encode())
+
+class Recorder:
+    def __init__(self, path, module, seed, clock, durations, buffer_size=64 * 1024):
+        self.clock = clock
+        self.file = open(path, 'wb', buffering=buffer_size)
+        name = module.encode()
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, *durations, len(name)) + name)
+        self.board = None
+        self.records = 0
+
+    def write(self, kind, *values, tick=None):
+        self.file.write(kind + RECORDS[kind].pack(self.clock() if tick is None else tick, *values))
+        self.records += 1
+
+    def click(self, pos):
+        self.write(b'C', *pos)
+
+    def key(self, key):
+        self.write(b'K', key)
+
+    def scroll(self, dy):
+        self.write(b'S', dy)
+
+    def frame(self, game):
+        # Called between the events and game.update() of every frame
+        if game.board is not self.board:
+            self.board = game.board
+            if game.state == 'playing':
+                self.write(b'G', MODES.index(game.mode), len(game.board), board_crc(game.board))
+
+    def update(self, tick):
+        # game.update() fired timers at `tick`; reading the clock again here could log a later tick
+        self.write(b'U', tick=tick)
+
+    def close(self):
+        self.file.close()
+
+def start_recording(game, module):
+    # Recorder for the game when TRUC_XANH_RECORD is set, otherwise None
+    path = os.environ.get('TRUC_XANH_RECORD')
+    if not path:
+        return None
+    seed = random.SystemRandom().getrandbits(63)
+    game.rng = random.Random(seed)
+    durations = (game.wait_duration, game.message_duration, game.hint_duration)  # E.g. shortened by soak.py --fast
+    recorder = Recorder(path, module, seed, game.clock, durations)
+    atexit.register(recorder.close)
+    return recorder
+
+def read_log(path):
+    # Yields the header as ('H', seed, durations, module), then each record as (kind, tick, *values)
+    with open(path, 'rb') as log:
+        data = log.read()
+    if data[:4] != MAGIC or data[4:5] != bytes([VERSION]) or len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a version {VERSION} replay log")
+    _, _, seed, *durations, name_length = HEADER.unpack_from(data)
+    offset = HEADER.size + name_length
+    yield ('H', seed, tuple(durations), data[HEADER.size:offset].decode())
+    while offset < len(data):
+        kind = data[offset:offset + 1]
+        record = RECORDS.get(kind)
+        if record is None or offset + 1 + record.size > len(data):
+            break  # A log cut off mid-record by a crash still replays up to there
+        yield (kind.decode(),) + record.unpack_from(data, offset + 1)
+        offset += 1 + record.size
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+def replay(path, realtime=False, render=False):
+    records = read_log(path)
+    _, seed, durations, module_name = next(records)
+    if not render:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    module = importlib.import_module(module_name)
+    game = module.game
+    clock = VirtualClock()
+    game.clock = clock
+    game.rng = random.Random(seed)
+    game.wait_duration, game.message_duration, game.hint_duration = durations
+    counts = {}
+    start = time.perf_counter()
+    first_tick = None
+    for kind, tick, *values in records:
+        if first_tick is None:
+            first_tick = tick
+        if realtime:
+            delay = (tick - first_tick) / 1000 - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        clock.now = tick
+        counts[kind] = counts.get(kind, 0) + 1
+        if kind == 'C':
+            game.handle_click(tuple(values))
+        elif kind == 'K':
+            game.handle_key(values[0])
+        elif kind == 'S':
+            if game.state == 'playing':
+                game.scroll(values[0])
+        elif kind == 'U':
+            game.update()
+        elif kind == 'G':
+            mode, cards, crc = values
+            if (game.mode, len(game.board), board_crc(game.board)) != (MODES[mode], cards, crc):
+                raise ValueError(f"Replay diverged at tick {tick}: the deal does not match the recording")
+        if not module.pygame.display.get_init():
+            break  # The recording ended with the Exit button
+        if render:
+            game.draw()
+            module.renderer.present()
+    elapsed = time.perf_counter() - start
+    return {'module': module_name, 'seed': seed, 'records': counts, 'session_ms': tick - first_tick if counts else 0,
+            'replay_ms': elapsed * 1000, 'state': game.state, 'scores': dict(game.scores)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded Truc Xanh session")
+    parser.add_argument('log', help="file written with TRUC_XANH_RECORD")
+    parser.add_argument('--realtime', action='store_true', help="keep the recorded timing instead of max speed")
+    parser.add_argument('--render', action='store_true', help="draw every step in the game window")
+    args = parser.parse_args()
+    result = replay(args.log, args.realtime, args.render)
+    print(f"Replayed {sum(result['records'].values())} records {result['records']} of {result['module']} "
+          f"(seed {result['seed']}): {result['session_ms'] / 1000:.1f} s session in {result['replay_ms']:.1f} ms")
+    print(f"Final state: {result['state']}, scores {result['scores']}")
+
+if __name__ == "__main__":
+    main()
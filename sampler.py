@@ -0,0 +1,127 @@
+import argparse
+import atexit
+import os
+from collections import OrderedDict
+import numpy as np
+import pygame
+import pcm_cache
+from synth_bank import key_name
+
+# Piano notes pitch-shifted from a sparse set of anchor samples. Only one
+# sample every `anchor_step` semitones is ever read; every other key is
+# resampled from the nearest anchor with cubic (Catmull-Rom) interpolation, all
+# requested keys in one batched NumPy pass. Anchors are only held while a batch
+# is rendered (pcm_cache maps them straight from disk), so resident audio is
+# just the bounded LRU of Sound objects. With anchors every 3 semitones no note
+# is shifted by more than one semitone, so no extra low-pass filter is needed.
+class Sampler:
+    def __init__(self, anchor_step=3, max_sounds=32, sound_dir="piano-mp3", compare_notes=None):
+        self.anchor_step = anchor_step
+        self.max_sounds = max_sounds
+        self.sound_dir = sound_dir
+        self.anchor_keys = [key for key in range(1, 89, anchor_step)
+                            if os.path.exists(self.sample_path(key))]
+        self.sounds = OrderedDict()  # key -> (Sound, bytes)
+        self.rendered = 0
+        self.anchor_loads = 0
+        if compare_notes and os.environ.get('TRUC_XANH_AUDIO_STATS'):
+            atexit.register(lambda: print(self.report(compare_notes)))
+
+    def sample_path(self, key):
+        return os.path.join(self.sound_dir, f"{key_name(key)}.mp3")
+
+    def anchor_for(self, key):
+        # Nearest anchor, preferring the higher one on a tie (shifting down never aliases)
+        return min(self.anchor_keys, key=lambda anchor: (abs(anchor - key), -anchor))
+
+    def anchor(self, key):
+        # Int16 PCM of an anchor sample as (samples, channels)
+        self.anchor_loads += 1
+        pcm = pygame.sndarray.array(pcm_cache.load_sound(self.sample_path(key)))
+        return pcm[:, None] if pcm.ndim == 1 else pcm
+
+    def render(self, keys):
+        # Int16 PCM for each key; all keys are interpolated together from one padded source buffer
+        anchors = [self.anchor_for(key) for key in keys]
+        needed = list(dict.fromkeys(anchors))
+        parts, offsets, sizes, start = [], {}, {}, 0
+        for anchor in needed:
+            pcm = self.anchor(anchor).astype(np.float32)
+            parts.append(np.pad(pcm, ((1, 2), (0, 0))))  # Room for the taps either side
+            offsets[anchor] = start + 1
+            sizes[anchor] = len(pcm)
+            start += len(pcm) + 3
+        source = np.concatenate(parts)
+
+        lengths, positions = [], []
+        for key, anchor in zip(keys, anchors):
+            ratio = 2 ** ((key - anchor) / 12)
+            length = int((sizes[anchor] - 1) / ratio) + 1
+            lengths.append(length)
+            positions.append(offsets[anchor] + np.arange(length) * ratio)
+        positions = np.concatenate(positions)
+        i = positions.astype(np.int64)
+        f = (positions - i).astype(np.float32)[:, None]
+        y0, y1, y2, y3 = source[i - 1], source[i], source[i + 1], source[i + 2]
+        out = y1 + 0.5 * f * (y2 - y0 + f * (2 * y0 - 5 * y1 + 4 * y2 - y3 + f * (3 * (y1 - y2) + y3 - y0)))
+        out = np.clip(out, -32768, 32767).astype(np.int16)
+        self.rendered += len(keys)
+        return np.split(out, np.cumsum(lengths)[:-1])
+
+    def make_sound(self, pcm):
+        if pcm.shape[1] == 1:
+            pcm = pcm[:, 0]
+        return pygame.sndarray.make_sound(np.ascontiguousarray(pcm))
+
+    def prepare(self, keys):
+        # Make sure every key has a Sound, resampling all missing ones in one batch
+        keys = list(dict.fromkeys(keys))
+        for key in keys:
+            if key in self.sounds:
+                self.sounds.move_to_end(key)
+        missing = [key for key in keys if key not in self.sounds]
+        if missing:
+            for key, pcm in zip(missing, self.render(missing)):
+                self.sounds[key] = (self.make_sound(pcm), pcm.nbytes)
+        while len(self.sounds) > max(self.max_sounds, len(keys)):
+            self.sounds.popitem(last=False)
+
+    def sound(self, key):
+        if key not in self.sounds:
+            self.prepare([key])
+        self.sounds.move_to_end(key)
+        return self.sounds[key][0]
+
+    def stats(self):
+        return {'cached': len(self.sounds), 'rendered': self.rendered, 'anchor_loads': self.anchor_loads,
+                'resident_bytes': sum(nbytes for _, nbytes in self.sounds.values())}
+
+    def decoded_bytes(self, notes):
+        # Keeping every note fully decoded: the piano samples all have the same length,
+        # so each costs about as much as an unshifted anchor
+        if not self.sounds:
+            return 0
+        per_note = sum(nbytes for _, nbytes in self.sounds.values()) / len(self.sounds)
+        return int(per_note * len(notes))
+
+    def report(self, notes):
+        stats = self.stats()
+        full = self.decoded_bytes(notes)
+        return (f"Sampler: {stats['resident_bytes'] / 2**20:.1f} MiB resident for {stats['cached']} notes "
+                f"({stats['anchor_loads']} anchor reads) vs ~{full / 2**20:.1f} MiB for {len(notes)} decoded notes")
+
+def main():
+    # Resample the whole keyboard and compare memory with decoding all 88 samples
+    parser = argparse.ArgumentParser(description="Pitch-shifted piano sampler")
+    parser.add_argument('--step', type=int, default=3, help="semitones between anchor samples")
+    parser.add_argument('--max-sounds', type=int, default=32)
+    args = parser.parse_args()
+    pygame.mixer.init()
+    sampler = Sampler(args.step, args.max_sounds)
+    keys = list(range(1, 89))
+    for start in range(0, len(keys), args.max_sounds):
+        sampler.prepare(keys[start:start + args.max_sounds])
+    print(sampler.report([key_name(key) for key in keys]))
+
+if __name__ == "__main__":
+    main()
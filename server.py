@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from game_logic import MemoryGame, NOTES, FLIP, UNFLIP, MATCH, MISMATCH, HINT, TURN, GAME_OVER
+
+# Authoritative game server. Every session runs a MemoryGame on the server and
+# clients only send requests; the results go back to everyone in the session
+# as small JSON-lines diffs, and a card's note is only sent once it is turned
+# face up. Protocol (one JSON object per line):
+#   client -> server  {"op": "join", "pairs": 10, "players": 2, "room": "optional name"}
+#                     {"op": "flip", "i": 3}   {"op": "hint"}   {"op": "leave"}
+#   server -> client  {"t": "joined", "room": r, "seat": 1}
+#                     {"t": "start", "n": cards, "hints": 5}
+#                     {"t": "f", "i": idx, "n": note}        flip
+#                     {"t": "u", "i": [a, b]}                unflip
+#                     {"t": "m", "i": [a, b], "s": [p1, p2]} match and scores
+#                     {"t": "x", "i": [a, b]}                mismatch
+#                     {"t": "h", "i": idx, "n": note}        hint
+#                     {"t": "p", "p": player}                turn
+#                     {"t": "o", "w": winner}                game over (0 for a tie)
+#                     {"t": "left"}  {"t": "error", "e": message}
+# Nothing here blocks: writes only fill the transport buffer, a client that
+# stops reading is dropped once its buffer passes MAX_BUFFER, and mismatch
+# delays are loop timers rather than sleeps.
+MAX_BUFFER = 256 * 1024
+MAX_PAIRS = 200
+
+def clock():
+    return int(time.monotonic() * 1000)
+
+def encode(message):
+    return (json.dumps(message, separators=(',', ':')) + "\n").encode()
+
+class Connection:
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.session = None
+        self.seat = None
+
+    def send(self, data):
+        if self.writer.is_closing():
+            return
+        if self.writer.transport.get_write_buffer_size() > MAX_BUFFER:
+            self.writer.close()  # Too slow to keep up; the read loop sees EOF and cleans up
+            return
+        self.writer.write(data)
+        self.server.messages_sent += 1
+
+class Session:
+    def __init__(self, server, room, pairs, players, wait_duration):
+        self.server = server
+        self.room = room
+        self.pairs = pairs
+        self.players = players
+        self.seats = {}  # seat -> Connection
+        self.game = MemoryGame(server.notes, clock, hints=server.hints, wait_duration=wait_duration,
+                               message_duration=0, listener=self.on_event)
+        self.timer = None
+
+    def broadcast(self, message):
+        data = encode(message)
+        for connection in self.seats.values():
+            connection.send(data)
+
+    def join(self, connection):
+        seat = next(seat for seat in range(1, self.players + 1) if seat not in self.seats)
+        self.seats[seat] = connection
+        connection.session, connection.seat = self, seat
+        connection.send(encode({'t': 'joined', 'room': self.room, 'seat': seat}))
+        if len(self.seats) == self.players:
+            self.game.deal('multi' if self.players == 2 else 'single', self.pairs, reuse=True)
+            self.broadcast({'t': 'start', 'n': len(self.game.board), 'hints': self.game.hints_remaining})
+            self.server.games_started += 1
+
+    def leave(self, connection):
+        self.seats.pop(connection.seat, None)
+        connection.session = connection.seat = None
+        self.broadcast({'t': 'left'})
+        self.close()
+
+    def close(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        for connection in self.seats.values():
+            connection.session = connection.seat = None
+        self.seats = {}
+        self.server.close_session(self)
+
+    def on_event(self, kind, data):
+        board = self.game.board
+        if kind == FLIP:
+            self.broadcast({'t': 'f', 'i': data, 'n': board.note(data)})
+        elif kind == UNFLIP:
+            self.broadcast({'t': 'u', 'i': list(data)})
+        elif kind == MATCH:
+            self.broadcast({'t': 'm', 'i': list(data), 's': [self.game.scores[1], self.game.scores[2]]})
+        elif kind == MISMATCH:
+            self.broadcast({'t': 'x', 'i': list(data)})
+        elif kind == HINT:
+            self.broadcast({'t': 'h', 'i': data, 'n': board.note(data)})
+        elif kind == TURN:
+            self.broadcast({'t': 'p', 'p': data})
+        elif kind == GAME_OVER:
+            self.broadcast({'t': 'o', 'w': data})
+            self.server.games_finished += 1
+            self.close()  # Players join again for the next game
+
+    def request(self, connection, message):
+        game = self.game
+        if game.state != 'playing':
+            return "Game is not running"
+        if self.players == 2 and game.current_player != connection.seat:
+            return "Not your turn"
+        if message.get('op') == 'flip':
+            idx = message.get('i')
+            if not isinstance(idx, int) or not 0 <= idx < len(game.board) or not game.flip(idx):
+                return "Card cannot be flipped"
+        else:
+            game.use_hint()
+        self.schedule()
+        return None
+
+    def schedule(self):
+        # Run update() when the mismatch delay ends instead of polling
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        deadline = self.game.next_deadline()
+        if deadline is not None:
+            self.timer = asyncio.get_running_loop().call_later(max(0, deadline - clock()) / 1000, self.tick)
+
+    def tick(self):
+        self.timer = None
+        self.game.update()
+        self.schedule()
+
+class GameServer:
+    def __init__(self, notes=NOTES, hints=5, wait_duration=1000):
+        self.notes = notes
+        self.hints = hints
+        self.wait_duration = wait_duration
+        self.sessions = {}  # room -> Session
+        self.open_sessions = {}  # (pairs, players) -> Session waiting for players
+        self.room_ids = itertools.count(1)
+        self.connections = 0
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.games_started = 0
+        self.games_finished = 0
+
+    def find_session(self, message):
+        pairs = message.get('pairs', 10)
+        players = message.get('players', 2)
+        if not isinstance(pairs, int) or not 1 <= pairs <= MAX_PAIRS or players not in (1, 2):
+            return None
+        room = message.get('room')
+        if room is not None:
+            session = self.sessions.get(room)
+            if session is None:
+                session = self.sessions[room] = Session(self, room, pairs, players, self.wait_duration)
+            return session if len(session.seats) < session.players else None
+        key = (pairs, players)
+        session = self.open_sessions.get(key)
+        if session is None:
+            room = f"#{next(self.room_ids)}"
+            session = self.sessions[room] = Session(self, room, pairs, players, self.wait_duration)
+            if players > 1:
+                self.open_sessions[key] = session
+        elif len(session.seats) + 1 == session.players:
+            del self.open_sessions[key]  # This join fills it
+        return session
+
+    def close_session(self, session):
+        self.sessions.pop(session.room, None)
+        key = (session.pairs, session.players)
+        if self.open_sessions.get(key) is session:
+            del self.open_sessions[key]
+
+    def handle(self, connection, message):
+        op = message.get('op')
+        if op == 'join':
+            if connection.session:
+                connection.session.leave(connection)
+            session = self.find_session(message)
+            if session is None:
+                return "Cannot join"
+            session.join(connection)
+        elif op == 'leave':
+            if connection.session:
+                connection.session.leave(connection)
+        elif op in ('flip', 'hint'):
+            if not connection.session:
+                return "Not in a game"
+            return connection.session.request(connection, message)
+        else:
+            return f"Unknown op {op!r}"
+        return None
+
+    async def serve_client(self, reader, writer):
+        connection = Connection(self, reader, writer)
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.messages_received += 1
+                try:
+                    message = json.loads(line)
+                    error = self.handle(connection, message) if isinstance(message, dict) else "Bad message"
+                except ValueError:
+                    error = "Bad message"
+                if error:
+                    connection.send(encode({'t': 'error', 'e': error}))
+        except ConnectionError:
+            pass
+        finally:
+            if connection.session:
+                connection.session.leave(connection)
+            self.connections -= 1
+            writer.close()
+
+    def stats(self):
+        return {'connections': self.connections, 'sessions': len(self.sessions),
+                'games_started': self.games_started, 'games_finished': self.games_finished,
+                'messages_received': self.messages_received, 'messages_sent': self.messages_sent}
+
+    async def report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print(f"Server: {self.stats()}")
+
+async def serve(host, port, stats_interval=0, **options):
+    game_server = GameServer(**options)
+    server = await asyncio.start_server(game_server.serve_client, host, port, limit=4096, backlog=4096)
+    if stats_interval:
+        asyncio.ensure_future(game_server.report(stats_interval))
+    print(f"Serving on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Truc Xanh Music game server")
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--hints', type=int, default=5)
+    parser.add_argument('--wait-ms', type=int, default=1000, help="how long mismatched cards stay face up")
+    parser.add_argument('--stats', type=float, default=0, help="print server stats every N seconds")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.stats, hints=args.hints, wait_duration=args.wait_ms))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import json
+import time
+import numpy as np
+
+# Monte Carlo simulator for board sizes, hint budgets and player strategies.
+# Thousands of decks are dealt and played at once with NumPy, following the
+# rules of game_logic.MemoryGame: two flips per turn, a match scores and keeps
+# the turn, a mismatch passes it to the other player.
+#
+# Strategies differ only in how many past flips the player remembers:
+#   random   remembers nothing and flips unmatched cards at random
+#   perfect  remembers every card it has seen
+#   limited  remembers the last --memory flips
+# With hints left, a player who does not know the partner of its first card
+# uses a hint to flip it.
+#
+# A random player never knows a card, so its game is a chain on the number of
+# pairs left: each hint matches a pair outright, then with k pairs left a turn
+# matches with probability 1 / (2k - 1). play_random() draws the geometric
+# number of turns per pair for all games at once, which keeps random boards as
+# fast as the others although their games run to about pairs^2 moves.
+STRATEGIES = ('random', 'perfect', 'limited')
+UNSEEN = -(1 << 30)
+MAX_MEMORY = 1 << 29
+
+def strategy_memory(strategy, memory):
+    if strategy == 'random':
+        return 0
+    if strategy == 'perfect':
+        return MAX_MEMORY
+    return min(memory, MAX_MEMORY)
+
+def nth_true(mask, rank):
+    # Row of the rank-th True in every column of an (n, games) mask (n when there is none).
+    # A plain loop over the few rows with int16 counters beats cumsum/argmax along the short axis.
+    seen = np.zeros(mask.shape[1], np.int16)
+    row_index = np.zeros(mask.shape[1], np.int16)
+    for row in mask.view(np.int8):
+        seen += row
+        row_index += seen <= rank
+    return row_index
+
+def play_batch(rng, count, pairs, memory, hints, players):
+    # Cards are tracked in value space, one row per card and one column per game: cards 2k
+    # and 2k + 1 form pair k. Since the deal is uniformly random and players pick uniformly
+    # among the cards they do not know, positions on the board never need to be drawn.
+    n = pairs * 2
+    available = np.ones((n, count), bool)  # Not matched yet
+    last_seen = np.full((n, count), UNSEEN, np.int32)  # Reset to UNSEEN once matched
+    pairs_left = np.full(count, pairs, np.int16)
+    player = np.zeros(count, np.int8)
+    margin = np.zeros(count, np.int16)  # Player 1 score minus player 2 score
+    moves = np.zeros(count, np.int32)
+    mismatches = np.zeros(count, np.int32)
+    hints_left = np.full(count, hints, np.int32)
+    live = np.arange(count)
+    out = {key: np.zeros(count, np.int64) for key in ('moves', 'mismatches', 'margin', 'hints_used')}
+    step = 0
+    while live.size:
+        width = live.size
+        cols = np.arange(width)
+        known = last_seen > step - memory
+        known_pairs = known[0::2] & known[1::2]
+        has_pair = known_pairs.any(axis=0)
+        unknown = available ^ known
+        unknown_count = unknown.sum(axis=0, dtype=np.int16)
+        # Two distinct uniformly random ranks among the unknown cards
+        u = rng.random((2, width), dtype=np.float32)
+        rank1 = (u[0] * unknown_count).astype(np.int16)
+        rank2 = (u[1] * (unknown_count - 1)).astype(np.int16)
+        rank2 += rank2 >= rank1
+
+        first = np.where(has_pair, 2 * nth_true(known_pairs, 0), nth_true(unknown, rank1)).astype(np.int64)
+        np.minimum(first, n - 1, out=first)  # Columns without any candidate are never used
+        target = first ^ 1
+        target_known = known.reshape(-1)[target * width + cols]
+        use_hint = ~has_pair & ~target_known & (hints_left > 0)
+        second = np.where(has_pair | target_known | use_hint, target, nth_true(unknown, rank2))
+        np.minimum(second, n - 1, out=second)
+
+        is_match = second == target
+        hints_left -= use_hint
+        # Flat indices into the (n, width) arrays are much cheaper than 2-D fancy indexing
+        flat_first = first * width + cols
+        flat_second = second * width + cols
+        seen_flat = last_seen.reshape(-1)
+        seen_flat[flat_first] = np.where(is_match, UNSEEN, step)
+        seen_flat[flat_second] = np.where(is_match, UNSEEN, step + 1)
+        still_available = ~is_match
+        available_flat = available.reshape(-1)
+        available_flat[flat_first] = still_available
+        available_flat[flat_second] = still_available
+        margin += is_match
+        margin -= 2 * (is_match & (player == 1))
+        mismatches += ~is_match
+        moves += 1
+        pairs_left -= is_match
+        if players == 2:
+            player ^= ~is_match
+        step += 2
+
+        done = pairs_left == 0
+        if done.any():
+            ids = live[done]
+            out['moves'][ids] = moves[done]
+            out['mismatches'][ids] = mismatches[done]
+            out['margin'][ids] = margin[done]
+            out['hints_used'][ids] = hints - hints_left[done]
+            keep = ~done
+            # compress() keeps the card arrays C-contiguous so the flat views above stay views
+            live, available, last_seen = live[keep], available.compress(keep, axis=1), last_seen.compress(keep, axis=1)
+            pairs_left, player, margin = pairs_left[keep], player[keep], margin[keep]
+            moves, mismatches, hints_left = moves[keep], mismatches[keep], hints_left[keep]
+    return out
+
+def play_random(rng, count, pairs, hints, players):
+    # Same results as play_batch() with no memory, one vector draw per pair instead of per move
+    hinted = min(hints, pairs)
+    moves = np.full(count, hinted, np.int64)
+    mismatches = np.zeros(count, np.int64)
+    margin = np.full(count, hinted, np.int64)  # Hints are used first, by player 1 who still has the turn
+    player = np.zeros(count, np.int64)
+    for left in range(pairs - hinted, 0, -1):
+        turns = rng.geometric(1 / (2 * left - 1), count)
+        moves += turns
+        mismatches += turns - 1
+        if players == 2:
+            player ^= (turns - 1) & 1  # Every mismatch passes the turn
+        margin += 1 - 2 * player
+    return {'moves': moves, 'mismatches': mismatches, 'margin': margin, 'hints_used': np.full(count, hinted, np.int64)}
+
+def simulate(pairs, games, strategy='perfect', memory=8, hints=0, players=2, seed=None, batch=25000):
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+    rng = np.random.default_rng(seed)
+    mem = strategy_memory(strategy, memory)
+    results = [play_random(rng, min(batch, games - start), pairs, hints, players) if strategy == 'random' else
+               play_batch(rng, min(batch, games - start), pairs, mem, hints, players)
+               for start in range(0, games, batch)]
+    return {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+
+def distribution(values):
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    return {'mean': float(values.mean()), 'std': float(values.std()), 'p5': float(p5),
+            'p50': float(p50), 'p95': float(p95), 'max': int(values.max())}
+
+def summarize(result, players=2):
+    summary = {
+        'moves': distribution(result['moves']),
+        'mismatches': distribution(result['mismatches']),
+        'hints_used': float(result['hints_used'].mean())
+    }
+    if players == 2:
+        margin = result['margin']
+        summary['margin'] = distribution(np.abs(margin))
+        summary['player1_win_rate'] = float((margin > 0).mean())
+        summary['tie_rate'] = float((margin == 0).mean())
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of Truc Xanh Music boards")
+    parser.add_argument('--pairs', type=int, nargs='+', default=[10, 15, 20, 25])
+    parser.add_argument('--strategy', nargs='+', choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--memory', type=int, default=8, help="flips remembered by the limited strategy")
+    parser.add_argument('--hints', type=int, default=0)
+    parser.add_argument('--players', type=int, choices=(1, 2), default=2)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', help="write the full report to this file")
+    args = parser.parse_args()
+
+    report = []
+    for pairs in args.pairs:
+        for strategy in args.strategy:
+            start = time.perf_counter()
+            result = simulate(pairs, args.games, strategy, args.memory, args.hints, args.players, args.seed)
+            elapsed = time.perf_counter() - start
+            summary = summarize(result, args.players)
+            summary.update(pairs=pairs, strategy=strategy, games=args.games, games_per_second=args.games / elapsed)
+            report.append(summary)
+            line = (f"{pairs:>3} pairs {strategy:>8}: moves {summary['moves']['mean']:6.1f} "
+                    f"(p5 {summary['moves']['p5']:.0f}, p95 {summary['moves']['p95']:.0f}), "
+                    f"mismatches {summary['mismatches']['mean']:6.1f}")
+            if args.players == 2:
+                line += f", margin {summary['margin']['mean']:4.1f}, P1 wins {summary['player1_win_rate']:.1%}"
+            print(f"{line}  [{summary['games_per_second']:,.0f} games/s]")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
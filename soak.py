@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from board import MATCHED, HINT
+from frame_profiler import percentile
+from text_cache import text_cache
+
+# Soak test for kiosk builds: a bot plays the real game through its main()
+# loop under the dummy SDL drivers, posting MOUSEBUTTONDOWN/KEYDOWN events the
+# way a player would, for --games games or --hours hours. Every --window
+# seconds it records RSS, frame work-time percentiles (the events to present
+# phases of the game's FrameProfiler), games per minute and the sizes of the
+# game's caches. The run fails when a game-state check fails, when the last
+# quarter of the windows drifted past a threshold from the first ones, or when
+# it ended with fewer than 4 windows and so could not judge drift at all:
+#   python soak.py --module main_2 --games 2000 --fast
+#   python soak.py --module main_5 --hours 8 --skill 0.5 --json soak.json
+MENU_MODE_KEYS = ('K_1', 'K_2')
+MENU_GRID_KEYS = ('K_3', 'K_4')
+MARATHON_KEY = 'K_5'
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Peak only: KiB on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def object_counts(module):
+    # Sizes of everything the game caches or keeps alive between frames; each should level off
+    game = module.game
+    counts = {'text_surfaces': len(text_cache.surfaces), 'timers': len(game.timers),
+              'animations': len(module.animations.running), 'frame_tables': len(module.frame_tables.tables),
+              'tracked_rects': len(module.renderer.tracked)}
+    if hasattr(module, 'note_assets'):
+        counts['faces'] = len(module.note_assets.entries) + len(module.note_assets.scaled)
+        counts['sounds'] = len(module.note_assets.sounds.sounds)
+    if hasattr(module, 'synth'):
+        counts['sounds'] = len(module.synth.sounds)
+    return counts
+
+def object_limits(module):
+    # Caps of the bounded caches in object_counts(); growing up to a cap is not a leak
+    limits = {'text_surfaces': text_cache.max_size, 'frame_tables': module.frame_tables.max_tables}
+    if hasattr(module, 'note_assets'):
+        limits['faces'] = 2 * module.note_assets.max_notes
+    if hasattr(module, 'synth'):
+        limits['sounds'] = module.synth.max_sounds
+    return limits
+
+def check_state(game):
+    # Invariants of a running game; returns a description of the first one broken, or None
+    if game.state != 'playing':
+        return None
+    board = game.board
+    matched = sum(1 for flags in board.flags if flags & MATCHED)
+    hints = sum(1 for flags in board.flags if flags & HINT)
+    if matched != 2 * (game.scores[1] + game.scores[2]):
+        return f"{matched} cards matched but scores are {game.scores}"
+    if len(game.flipped_cards) > 2 or len(set(game.flipped_cards)) != len(game.flipped_cards):
+        return f"flipped cards {game.flipped_cards}"
+    if any(not board.is_flipped(idx) or board.is_matched(idx) for idx in game.flipped_cards):
+        return f"flipped cards {game.flipped_cards} are not all face up and unmatched"
+    if game.waiting != (len(game.flipped_cards) == 2):
+        return f"waiting is {game.waiting} with {len(game.flipped_cards)} cards flipped"
+    if hints > 1 or (game.hint_card is None) != (hints == 0):
+        return f"{hints} cards marked as hints, hint card {game.hint_card}"
+    if len(game.timers) > 3:
+        return f"{len(game.timers)} timers pending"
+    return None
+
+# Plays through posted events only. `skill` is both the chance of remembering
+# a card it saw and of taking a pair it remembers; it sometimes asks for a
+# hint, gives up a game with the Back button, or picks the marathon board.
+class SoakBot:
+    def __init__(self, module, rng, skill=0.7, hint_rate=0.1, back_rate=0.002, marathon_rate=0.05):
+        self.module = module
+        self.pygame = module.pygame
+        self.game = module.game
+        self.rng = rng
+        self.skill = skill
+        self.hint_rate = hint_rate
+        self.back_rate = back_rate
+        self.marathon_rate = marathon_rate
+        self.known = {}  # idx -> note the bot remembers
+        self.seen = ()
+        self.target = ((), None)  # (flipped cards when picked, card)
+        self.board = None
+        self.finished_board = None
+        self.games = 0
+        self.abandoned = 0
+        self.hints = 0
+        self.events = 0
+        self.handled = 0  # Set from the game's thread
+
+    def post(self, event_type, **attributes):
+        self.pygame.event.post(self.pygame.event.Event(event_type, soak=True, **attributes))
+        self.events += 1
+
+    def click(self, pos):
+        self.post(self.pygame.MOUSEBUTTONDOWN, pos=pos, button=1)
+
+    def key(self, name):
+        self.post(self.pygame.KEYDOWN, key=getattr(self.pygame, name))
+
+    def wheel(self, y):
+        self.post(self.pygame.MOUSEWHEEL, x=0, y=y)
+
+    def button(self, state, text):
+        buttons = self.game.buttons
+        buttons = buttons.get(state, []) if isinstance(buttons, dict) else buttons if state == 'menu' else []
+        for button in buttons:
+            if button.text == text:
+                return button
+        return None
+
+    def step(self):
+        # Acts once the game has handled everything posted so far
+        if self.handled < self.events:
+            return
+        game = self.game
+        if game.board is not self.board:
+            self.board, self.known, self.seen, self.target = game.board, {}, (), ((), None)
+        if game.state == 'menu':
+            self.key(self.rng.choice(MENU_MODE_KEYS))
+            self.key(MARATHON_KEY if self.rng.random() < self.marathon_rate else self.rng.choice(MENU_GRID_KEYS))
+        elif game.state == 'game_over':
+            if self.finished_board is not game.board:
+                self.finished_board = game.board
+                self.games += 1
+            play_again = self.button('game_over', "Play Again")
+            if play_again:
+                self.click(play_again.rect.center)
+            else:
+                self.key('K_r')
+        elif game.state == 'playing':
+            self.play()
+
+    def play(self):
+        game, board = self.game, self.game.board
+        flipped = tuple(game.flipped_cards)
+        for idx in flipped:
+            if idx not in self.seen and self.rng.random() < self.skill:
+                self.known[idx] = board.note(idx)
+        self.seen = flipped
+        if game.waiting:
+            return
+        back = self.button('playing', "Back")
+        if back and self.rng.random() < self.back_rate:
+            self.abandoned += 1
+            self.click(back.rect.center)
+            return
+        self.known = {idx: note for idx, note in self.known.items() if board.can_flip(idx) or idx in flipped}
+        target = None
+        picked_for, picked = self.target
+        if picked_for == flipped and picked is not None and board.can_flip(picked):
+            target = picked  # Still scrolling to the card it picked
+        elif not flipped:
+            by_note = {}
+            for idx, note in self.known.items():
+                by_note.setdefault(note, []).append(idx)
+            pairs = [cards for cards in by_note.values() if len(cards) > 1]
+            if pairs and self.rng.random() < self.skill:
+                target = self.rng.choice(pairs)[0]
+        elif len(flipped) == 1:
+            note = board.note(flipped[0])
+            partners = [idx for idx, known in self.known.items() if known == note and idx != flipped[0]]
+            hint = self.button('playing', "Hint")
+            if partners and self.rng.random() < self.skill:
+                target = partners[0]
+            elif game.hint_card is not None:
+                target = game.hint_card  # The hint shows the partner face up
+            elif hint and game.hints_remaining > 0 and self.rng.random() < self.hint_rate:
+                self.hints += 1
+                self.click(hint.rect.center)
+                return
+        if target is None:
+            # Explores like a player who scrolls: any card it does not remember, on screen or not
+            cards = [idx for idx in range(len(board)) if board.can_flip(idx)]
+            unknown = [idx for idx in cards if idx not in self.known]
+            target = self.rng.choice(unknown or cards)
+        self.target = (flipped, target)
+        self.flip(target)
+
+    def flip(self, idx):
+        area = self.module.BOARD_AREA
+        rect = self.module.pygame.Rect(self.game.card_index.card_rect(idx))
+        visible = rect.clip(area)
+        if visible.width < rect.width // 2 or visible.height < rect.height // 2:
+            notches = round((area.centery - rect.centery) / self.module.SCROLL_STEP)
+            self.wheel(notches or (1 if rect.y < area.y else -1))  # Scrolls the card to the middle
+            return
+        self.click(visible.center)
+
+# Watches the real main loop: the input layer's dispatch() and game.update()
+# are wrapped so the bot's events are counted once handled, and the state
+# checks, frame samples and windows are taken on the game's own thread
+class SoakMonitor:
+    def __init__(self, module, bot, window_s):
+        self.module = module
+        self.bot = bot
+        self.window_s = window_s
+        self.start = time.monotonic()
+        self.window_start = self.start
+        self.window_games = 0
+        self.frames_seen = module.profiler.frames
+        self.frame_ms = []
+        self.windows = []
+        self.problems = []
+        input_layer, game = module.input_layer, module.game
+        dispatch, update = input_layer.dispatch, game.update
+
+        def counted_dispatch(events):
+            running = dispatch(events)
+            bot.handled += sum(1 for event in events if getattr(event, 'soak', False))
+            return running
+
+        def checked_update():
+            fired = update()
+            self.after_update()
+            return fired
+        input_layer.dispatch = counted_dispatch
+        game.update = checked_update
+
+    def after_update(self):
+        profiler = self.module.profiler
+        if profiler.frames != self.frames_seen and profiler.history:
+            self.frames_seen = profiler.frames
+            self.frame_ms.append(sum(profiler.history[-1][2:7]) / 1e6)  # events, update, draw, overlay, present
+        problem = check_state(self.module.game)
+        if problem and len(self.problems) < 20:
+            self.problems.append((self.bot.games, problem))
+        now = time.monotonic()
+        if now - self.window_start >= self.window_s:
+            self.close_window(now)
+
+    def close_window(self, now):
+        values = sorted(self.frame_ms)
+        minutes = (now - self.window_start) / 60
+        window = {'t_s': round(now - self.start, 1), 'games': self.bot.games, 'events': self.bot.events,
+                  'games_per_minute': (self.bot.games - self.window_games) / minutes, 'rss_mb': rss_bytes() / 2**20,
+                  'frames': len(values), 'objects': object_counts(self.module)}
+        for p in (50, 95, 99):
+            window[f'frame_p{p}_ms'] = percentile(values, p)
+        self.windows.append(window)
+        print(f"{window['t_s']:8.0f} s  {window['games']:6d} games  {window['games_per_minute']:6.1f}/min  "
+              f"RSS {window['rss_mb']:6.1f} MiB  frame p50/p95/p99 {window['frame_p50_ms']:.2f}/"
+              f"{window['frame_p95_ms']:.2f}/{window['frame_p99_ms']:.2f} ms", flush=True)
+        self.window_start = now
+        self.window_games = self.bot.games
+        self.frame_ms = []
+
+def drift(windows, limits, max_rss_growth_mb, max_frame_drift, min_gpm_ratio):
+    # Compares the last quarter of the windows with the first quarter after the warm-up window
+    if len(windows) < 4:
+        return None, ["too few windows to judge drift; run longer or shorten --window"]
+    quarter = max(1, (len(windows) - 1) // 4)
+    first, last = windows[1:1 + quarter], windows[-quarter:]
+
+    def median(windows, key):
+        return statistics.median(window[key] for window in windows)
+
+    failures = []
+    report = {}
+    rss = (median(first, 'rss_mb'), median(last, 'rss_mb'))
+    report['rss_mb'] = rss
+    if rss[1] - rss[0] > max_rss_growth_mb:
+        failures.append(f"RSS grew {rss[1] - rss[0]:.1f} MiB (limit {max_rss_growth_mb})")
+    for key in ('frame_p50_ms', 'frame_p95_ms', 'frame_p99_ms'):
+        values = report[key] = (median(first, key), median(last, key))
+        if values[1] > values[0] * max_frame_drift and values[1] - values[0] > 1.0:
+            failures.append(f"{key} went from {values[0]:.2f} to {values[1]:.2f} ms (limit x{max_frame_drift})")
+    def rate(start, end):
+        # Over the whole span, since a window holds only a few games
+        return (end['games'] - start['games']) * 60 / (end['t_s'] - start['t_s'])
+
+    gpm = report['games_per_minute'] = (rate(windows[0], first[-1]), rate(windows[-quarter - 1], last[-1]))
+    if gpm[0] and gpm[1] < gpm[0] * min_gpm_ratio:
+        failures.append(f"games per minute fell from {gpm[0]:.1f} to {gpm[1]:.1f} (limit x{min_gpm_ratio})")
+    for name in windows[0]['objects']:
+        counts = (max(window['objects'].get(name, 0) for window in first),
+                  max(window['objects'].get(name, 0) for window in last))
+        report[name] = counts
+        if counts[1] > counts[0] * 2 + 16 and counts[1] > limits.get(name, 0):
+            failures.append(f"{name} grew from {counts[0]} to {counts[1]}")
+    return report, failures
+
+def soak(module_name, games, hours, skill, hint_rate, back_rate, marathon_rate, think_ms, window_s, seed, fast):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    module = importlib.import_module(module_name)
+    game = module.game
+    rng = random.Random(seed)
+    game.rng = random.Random(rng.getrandbits(32))
+    if fast:
+        game.wait_duration, game.message_duration, game.hint_duration = 100, 200, 300
+    bot = SoakBot(module, rng, skill, hint_rate, back_rate, marathon_rate)
+    monitor = SoakMonitor(module, bot, window_s)
+    deadline = time.monotonic() + hours * 3600 if hours else None
+
+    def drive():
+        while not module.startup.done:
+            time.sleep(0.01)
+        while ((games is None or bot.games < games) and (deadline is None or time.monotonic() < deadline)
+               and len(monitor.problems) < 20):
+            bot.step()
+            time.sleep(think_ms / 1000)
+        bot.post(module.pygame.QUIT)
+
+    threading.Thread(target=drive, daemon=True).start()
+    asyncio.run(module.main())
+    elapsed = time.monotonic() - monitor.start
+    return {'module': module_name, 'games': bot.games, 'abandoned': bot.abandoned, 'hints': bot.hints,
+            'events': bot.events, 'elapsed_s': elapsed, 'windows': monitor.windows, 'limits': object_limits(module),
+            'problems': monitor.problems}
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot-driven soak test through the real game loop")
+    parser.add_argument('--module', choices=['main', 'main_2', 'main_5'], default='main_2')
+    parser.add_argument('--games', type=int, help="stop after this many finished games")
+    parser.add_argument('--hours', type=float, help="stop after this long")
+    parser.add_argument('--skill', type=float, default=0.7, help="0 plays at random, 1 never forgets a card")
+    parser.add_argument('--hint-rate', type=float, default=0.1, help="chance of asking for a hint per first card")
+    parser.add_argument('--back-rate', type=float, default=0.002, help="chance of leaving a game per move")
+    parser.add_argument('--marathon-rate', type=float, default=0.05, help="share of games on the marathon board")
+    parser.add_argument('--think-ms', type=float, default=20, help="bot delay between actions")
+    parser.add_argument('--window', type=float, default=60, help="seconds per recorded window")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--fast', action='store_true', help="shorten the mismatch, message and hint delays")
+    parser.add_argument('--max-rss-growth-mb', type=float, default=32)
+    parser.add_argument('--max-frame-drift', type=float, default=1.5, help="allowed ratio of late to early frame times")
+    parser.add_argument('--min-gpm-ratio', type=float, default=0.7, help="allowed ratio of late to early games/min")
+    parser.add_argument('--json', help="write the windows and the verdict to this file")
+    args = parser.parse_args()
+    if args.games is None and args.hours is None:
+        args.games = 1000
+    if args.hours is not None and args.hours * 3600 < 4 * args.window:
+        parser.error("--hours must cover at least 4 windows of --window seconds to judge drift")
+
+    result = soak(args.module, args.games, args.hours, args.skill, args.hint_rate, args.back_rate,
+                  args.marathon_rate, args.think_ms, args.window, args.seed, args.fast)
+    report, failures = drift(result['windows'], result['limits'], args.max_rss_growth_mb, args.max_frame_drift, args.min_gpm_ratio)
+    failures = [f"after {games} games: {problem}" for games, problem in result['problems']] + failures
+    print(f"{result['games']} games ({result['abandoned']} abandoned, {result['hints']} hints) in "
+          f"{result['elapsed_s'] / 60:.1f} min, {result['events']} events posted")
+    if report:
+        for name, (first, last) in report.items():
+            print(f"  {name:<18} {first:10.2f} -> {last:10.2f}")
+    result.update(drift=report, failures=failures)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)  # Including a run too short for a drift verdict, which checked nothing
+    print("Soak passed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+from collections import OrderedDict
+import numpy as np
+import pygame
+import pcm_cache
+
+# Decoded piano samples cost the same in memory whether they are ringing or
+# silent, so tails are trimmed before caching and the decoded sounds live in a
+# byte-budgeted cache instead of one Sound per note for the whole session.
+#
+# SoundPrep cuts everything after the last sample within `threshold_db` of the
+# note's peak (and optionally anything past `max_seconds`), then fades the
+# last `fade_ms` out so the cut does not click. The result is what pcm_cache
+# stores on disk. Mono comes from the mixer: with TRUC_XANH_AUDIO_CHANNELS=1
+# SDL decodes every sample to one channel, halving each note again.
+class SoundPrep:
+    def __init__(self, threshold_db=-40.0, fade_ms=50, max_seconds=None):
+        self.threshold_db = threshold_db
+        self.fade_ms = fade_ms
+        self.max_seconds = max_seconds
+        self.saved = {}  # note -> (bytes before, bytes after), for notes processed this session
+
+    def key(self):
+        return f"trim{self.threshold_db:g}-fade{self.fade_ms}-max{self.max_seconds}"
+
+    def trim(self, pcm, sample_rate):
+        # Int16 PCM of shape (samples,) or (samples, channels) without its silent tail
+        level = np.abs(pcm.reshape(len(pcm), -1).astype(np.int32)).max(axis=1)
+        peak = level.max() if len(level) else 0
+        if not peak:
+            return pcm[:1]
+        loud = np.flatnonzero(level > peak * 10 ** (self.threshold_db / 20))
+        end = loud[-1] + 1
+        if self.max_seconds:
+            end = min(end, int(self.max_seconds * sample_rate))
+        fade = min(end, int(self.fade_ms * sample_rate / 1000))
+        pcm = pcm[:end].copy()
+        if fade:
+            ramp = np.linspace(1.0, 0.0, fade, dtype=np.float32)
+            tail = pcm[end - fade:].astype(np.float32)
+            pcm[end - fade:] = (tail * (ramp if pcm.ndim == 1 else ramp[:, None])).astype(np.int16)
+        return pcm
+
+    def apply(self, sound, name=None):
+        pcm = pygame.sndarray.array(sound)
+        trimmed = self.trim(pcm, pygame.mixer.get_init()[0])
+        if name is not None:
+            self.saved[name] = (pcm.nbytes, trimmed.nbytes)
+        return pygame.sndarray.make_sound(np.ascontiguousarray(trimmed))
+
+    def report(self):
+        lines = [f"  {name:<4} {before / 1024:7.0f} KiB -> {after / 1024:6.0f} KiB  (saved {(before - after) / 1024:.0f} KiB)"
+                 for name, (before, after) in sorted(self.saved.items())]
+        before = sum(b for b, _ in self.saved.values())
+        after = sum(a for _, a in self.saved.values())
+        lines.append(f"  total {before / 2**20:.1f} MiB -> {after / 2**20:.1f} MiB")
+        return "\n".join(lines)
+
+def sound_bytes(sound):
+    frequency, size, channels = pygame.mixer.get_init()
+    return int(round(sound.get_length() * frequency)) * channels * abs(size) // 8
+
+# Sounds by key under a byte budget. play-order is what counts: played() moves
+# a key to the back and the front is evicted first, except the sound being
+# added, so the resident footprint stays flat however many notes come through.
+class SoundBudget:
+    def __init__(self, max_bytes=8 * 2**20):
+        self.max_bytes = max_bytes
+        self.sounds = OrderedDict()  # key -> (Sound, bytes), least recently played first
+        self.bytes = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, key, loader):
+        entry = self.sounds.get(key)
+        if entry is None:
+            sound = loader()
+            entry = self.sounds[key] = (sound, sound_bytes(sound))
+            self.bytes += entry[1]
+            self.loads += 1
+            self.evict(keep=key)
+        return entry[0]
+
+    def played(self, key):
+        if key in self.sounds:
+            self.sounds.move_to_end(key)
+
+    def evict(self, keep=None):
+        for key in list(self.sounds):
+            if self.bytes <= self.max_bytes:
+                break
+            if key != keep:
+                self.bytes -= self.sounds.pop(key)[1]
+                self.evictions += 1
+
+    def stats(self):
+        return {'cached': len(self.sounds), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                'loads': self.loads, 'evictions': self.evictions}
+
+def main():
+    # Bytes saved per piano sample with the default SoundPrep in the current mixer format
+    pygame.mixer.init()
+    prep = SoundPrep()
+    sound_dir = "piano-mp3"
+    for file_name in sorted(os.listdir(sound_dir)):
+        if file_name.endswith(".mp3"):
+            prep.apply(pcm_cache.load_sound(os.path.join(sound_dir, file_name)), file_name[:-4])
+    print(prep.report())
+
+if __name__ == "__main__":
+    main()
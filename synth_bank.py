@@ -0,0 +1,122 @@
+import hashlib
+import os
+from collections import OrderedDict
+import numpy as np
+import pygame
+
+# Additive synthesiser for any of the 88 piano keys (key 1 = A0, key 49 = A4,
+# key 88 = C8). Notes are rendered in one batched NumPy pass, kept in an LRU of
+# Sound objects and cached on disk keyed by the synthesis parameters.
+CACHE_DIR = os.path.join(".cache", "synth")
+SEMITONES = {'C': 0, 'Db': 1, 'D': 2, 'Eb': 3, 'E': 4, 'F': 5, 'Gb': 6, 'G': 7, 'Ab': 8, 'A': 9, 'Bb': 10, 'B': 11}
+NAMES = list(SEMITONES)
+
+def key_number(name):
+    # 'C4' -> 40, 'A4' -> 49, 'Bb0' -> 2
+    return 12 * int(name[-1]) + SEMITONES[name[:-1]] - 8
+
+def key_name(key):
+    # 40 -> 'C4', inverse of key_number
+    octave, semitone = divmod(key + 8, 12)
+    return f"{NAMES[semitone]}{octave}"
+
+def key_frequency(key):
+    return 440.0 * 2 ** ((key - 49) / 12)  # Equal temperament around A4
+
+class SynthBank:
+    def __init__(self, duration=0.5, harmonics=(1.0, 0.5, 0.25, 0.125), adsr=(0.01, 0.08, 0.6, 0.15),
+                 amplitude=0.5, max_sounds=32, cache_dir=CACHE_DIR):
+        self.duration = duration
+        self.harmonics = harmonics  # Relative amplitude of the fundamental and each overtone
+        self.adsr = adsr  # Attack, decay and release in seconds, sustain as a level
+        self.amplitude = amplitude
+        self.max_sounds = max_sounds
+        self.cache_dir = cache_dir
+        self.sounds = OrderedDict()
+        self.rendered = 0
+        self.disk_hits = 0
+
+    def mixer_format(self):
+        sample_rate, _, channels = pygame.mixer.get_init() or (44100, -16, 2)
+        return sample_rate, channels
+
+    def params_hash(self):
+        params = (self.duration, self.harmonics, self.adsr, self.amplitude, self.mixer_format())
+        return hashlib.sha1(repr(params).encode()).hexdigest()[:16]
+
+    def envelope(self, sample_rate, samples):
+        attack, decay, sustain, release = self.adsr
+        t = np.arange(samples) / sample_rate
+        points = [0.0, attack, attack + decay, max(attack + decay, self.duration - release), self.duration]
+        return np.interp(t, points, [0.0, 1.0, sustain, sustain, 0.0])
+
+    def render(self, keys):
+        # One (len(keys), samples) int16 array for all requested keys
+        sample_rate, _ = self.mixer_format()
+        samples = int(sample_rate * self.duration)
+        t = np.arange(samples) / sample_rate
+        frequencies = np.array([key_frequency(key) for key in keys])[:, None]
+        waves = np.zeros((len(keys), samples))
+        for number, level in enumerate(self.harmonics, start=1):
+            audible = (frequencies * number < sample_rate / 2)  # Drop overtones above Nyquist
+            waves += level * audible * np.sin(2 * np.pi * number * frequencies * t)
+        waves *= self.amplitude / sum(self.harmonics) * self.envelope(sample_rate, samples)
+        self.rendered += len(keys)
+        return (waves * 32767).astype(np.int16)
+
+    def cache_file(self, key):
+        return os.path.join(self.cache_dir, f"{key}-{self.params_hash()}.npy")
+
+    def load_cached(self, key):
+        try:
+            return np.load(self.cache_file(key))
+        except (OSError, ValueError):
+            return None
+
+    def save_cached(self, key, wave):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.save(self.cache_file(key), wave)
+        except OSError as e:
+            print(f"Could not cache synth note {key}: {e}")
+
+    def make_sound(self, wave):
+        _, channels = self.mixer_format()
+        if channels > 1:
+            wave = np.repeat(wave[:, None], channels, axis=1)
+        return pygame.sndarray.make_sound(np.ascontiguousarray(wave))
+
+    def prepare(self, keys):
+        # Make sure every key has a Sound, rendering all missing ones in one batch
+        if not pygame.mixer.get_init():
+            return  # No audio device: sound() returns None and nothing is rendered
+        keys = list(dict.fromkeys(keys))
+        waves = {}
+        for key in keys:
+            if key in self.sounds:
+                self.sounds.move_to_end(key)
+                continue
+            wave = self.load_cached(key)
+            if wave is not None:
+                self.disk_hits += 1
+                waves[key] = wave
+        missing = [key for key in keys if key not in self.sounds and key not in waves]
+        if missing:
+            for key, wave in zip(missing, self.render(missing)):
+                self.save_cached(key, wave)
+                waves[key] = wave
+        for key, wave in waves.items():
+            self.sounds[key] = self.make_sound(wave)
+        while len(self.sounds) > max(self.max_sounds, len(keys)):
+            self.sounds.popitem(last=False)
+
+    def sound(self, key):
+        if not pygame.mixer.get_init():
+            return None
+        if key not in self.sounds:
+            self.prepare([key])
+        self.sounds.move_to_end(key)
+        return self.sounds[key]
+
+    def stats(self):
+        return {'cached': len(self.sounds), 'rendered': self.rendered, 'disk_hits': self.disk_hits}
@@ -0,0 +1,68 @@
+import glob
+import json
+import math
+import os
+import pygame
+
+# Card faces packed into one pre-scaled image per card size. Build offline with
+#   python texture_atlas.py
+# and the game loads each atlas in a single read and hands out subsurfaces.
+IMAGE_DIR = "images"
+INDEX_FILE = "atlas.json"
+ATLAS_SIZES = [(60, 60), (90, 90)]
+
+def size_key(size):
+    return f"{size[0]}x{size[1]}"
+
+def pack(images, size):
+    width, height = size
+    cols = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / cols)
+    atlas = pygame.Surface((cols * width, rows * height), pygame.SRCALPHA)
+    rects = {}
+    for i, (note, image) in enumerate(sorted(images.items())):
+        x, y = (i % cols) * width, (i // cols) * height
+        atlas.blit(pygame.transform.scale(image, size), (x, y))
+        rects[note] = [x, y, width, height]
+    return atlas, rects
+
+def build(image_dir=IMAGE_DIR, sizes=ATLAS_SIZES):
+    images = {}
+    for path in glob.glob(os.path.join(image_dir, "*.png")):
+        note = os.path.splitext(os.path.basename(path))[0]
+        if note.startswith("atlas_"):
+            continue
+        images[note] = pygame.image.load(path)
+    index = {}
+    for size in sizes:
+        atlas, rects = pack(images, size)
+        file_name = f"atlas_{size_key(size)}.png"
+        pygame.image.save(atlas, os.path.join(image_dir, file_name))
+        index[size_key(size)] = {'file': file_name, 'rects': rects}
+    with open(os.path.join(image_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    return index
+
+def load_atlas(size, image_dir=IMAGE_DIR):
+    # Returns {note: subsurface} for one card size, or None when no atlas was built for it
+    try:
+        with open(os.path.join(image_dir, INDEX_FILE)) as f:
+            entry = json.load(f).get(size_key(size))
+    except (OSError, ValueError):
+        return None
+    if entry is None:
+        return None
+    try:
+        atlas = pygame.image.load(os.path.join(image_dir, entry['file']))
+    except (pygame.error, FileNotFoundError) as e:
+        print(f"Error loading atlas {entry['file']}: {e}")
+        return None
+    if pygame.display.get_surface():
+        atlas = atlas.convert_alpha()  # Convert once to the display format so card blits are plain copies
+    return {note: atlas.subsurface(pygame.Rect(rect)) for note, rect in entry['rects'].items()}
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    for key, entry in build().items():
+        print(f"{entry['file']}: {len(entry['rects'])} faces at {key}")
@@ -0,0 +1,70 @@
+import heapq
+import itertools
+
+# Callbacks at absolute deadlines (clock milliseconds) kept on a binary heap,
+# so scheduling and firing cost O(log n) even with thousands pending. A
+# cancelled timer stays in the heap until it reaches the top, which keeps
+# cancel() O(1); the heap is rebuilt without them once they are more than
+# half of it. The queue has no clock of its own: its owner passes the time to
+# run(), so a game whose clock is swapped (replay.py) keeps working.
+class Timer:
+    __slots__ = ('deadline', 'callback', 'args', 'pending')
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.pending = True
+
+class TimerQueue:
+    def __init__(self):
+        self.heap = []  # (deadline, sequence, timer); the sequence keeps equal deadlines in order
+        self.sequence = itertools.count()
+        self.cancelled = 0  # Cancelled timers still in the heap
+
+    def __len__(self):
+        return len(self.heap) - self.cancelled
+
+    def schedule(self, deadline, callback, *args):
+        timer = Timer(deadline, callback, args)
+        heapq.heappush(self.heap, (deadline, next(self.sequence), timer))
+        return timer
+
+    def cancel(self, timer):
+        # Safe to call with None or a timer that already fired
+        if timer is None or not timer.pending:
+            return
+        timer.pending = False
+        self.cancelled += 1
+        if self.cancelled > 64 and self.cancelled * 2 > len(self.heap):
+            self.heap[:] = [entry for entry in self.heap if entry[2].pending]  # In place, run() may be iterating
+            heapq.heapify(self.heap)
+            self.cancelled = 0
+
+    def clear(self):
+        for _, _, timer in self.heap:
+            timer.pending = False
+        self.heap[:] = []
+        self.cancelled = 0
+
+    def next_deadline(self):
+        # Earliest pending deadline, or None when nothing is scheduled
+        heap = self.heap
+        while heap and not heap[0][2].pending:
+            heapq.heappop(heap)
+            self.cancelled -= 1
+        return heap[0][0] if heap else None
+
+    def run(self, now):
+        # Fire every timer due by `now` in deadline order; returns how many fired
+        heap = self.heap
+        fired = 0
+        while heap and heap[0][0] <= now:
+            timer = heapq.heappop(heap)[2]
+            if not timer.pending:
+                self.cancelled -= 1
+                continue
+            timer.pending = False
+            timer.callback(*timer.args)
+            fired += 1
+        return fired
@@ -0,0 +1,368 @@
+import argparse
+import asyncio
+import functools
+import glob
+import hashlib
+import http.server
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+import pygame
+from texture_atlas import pack, size_key, ATLAS_SIZES, INDEX_FILE
+
+# Asset delivery for the web build. `build` turns the piano samples and note
+# images into a bundle a CDN can serve:
+#   sounds/<note>.ogg   samples transcoded with ffmpeg (copied as MP3 when ffmpeg is missing)
+#   images/             the texture_atlas atlases, so all faces are two PNGs
+#   manifest.json       size and sha256 of every file
+# AssetLoader streams a bundle in the background while the menu is up: the
+# atlases first, then the sounds of the game's notes, with the notes of a
+# dealt board moved to the front. Files are checked against the manifest and
+# kept in CACHE_DIR (TRUC_XANH_ASSET_CACHE), so a second visit only fetches
+# what changed. The browser build always streams the bundle from BUNDLE_PATH
+# next to its page with the page's fetch(); desktop builds only do so when
+# TRUC_XANH_ASSET_URL is set, over urllib.
+#   python web_assets.py build --out web
+#   python web_assets.py tti --module main_2 --bundle web --latency-ms 80 --kbps 1000
+# `tti` serves the bundle from a throttled local http.server standing in for
+# the CDN, runs the game headless against it and reports time to interactive.
+# `tti --fail` serves no bundle at all and checks that the game still becomes
+# interactive with its packaged notes.
+MANIFEST = "manifest.json"
+CACHE_DIR = os.environ.get('TRUC_XANH_ASSET_CACHE', os.path.join(".cache", "web"))
+BUNDLE_PATH = "web/"  # Where the browser build finds the bundle, relative to its page
+BROWSER = platform.system() == "Emscripten"
+SOUND_DIR = "piano-mp3"
+IMAGE_DIR = "images"
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def transcode(source, target_base, bitrate, channels):
+    # Returns the path written: Ogg Vorbis when ffmpeg is available, otherwise the MP3 unchanged
+    if shutil.which("ffmpeg"):
+        target = target_base + ".ogg"
+        subprocess.run(["ffmpeg", "-v", "error", "-y", "-i", source, "-ac", str(channels), "-c:a", "libvorbis",
+                        "-b:a", bitrate, target], check=True)
+        return target
+    target = target_base + os.path.splitext(source)[1]
+    shutil.copyfile(source, target)
+    return target
+
+def build(out, sound_dir=SOUND_DIR, image_dir=IMAGE_DIR, bitrate="64k", channels=1):
+    os.makedirs(os.path.join(out, "sounds"), exist_ok=True)
+    os.makedirs(os.path.join(out, "images"), exist_ok=True)
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg not found: samples are copied as MP3")
+    sounds = {}
+    for source in sorted(glob.glob(os.path.join(sound_dir, "*.mp3"))):
+        note = os.path.splitext(os.path.basename(source))[0]
+        target = transcode(source, os.path.join(out, "sounds", note), bitrate, channels)
+        sounds[note] = os.path.relpath(target, out).replace(os.sep, "/")
+
+    faces = {}
+    for path in glob.glob(os.path.join(image_dir, "*.png")):
+        note = os.path.splitext(os.path.basename(path))[0]
+        if not note.startswith("atlas_"):
+            faces[note] = pygame.image.load(path)
+    index = {}
+    for size in ATLAS_SIZES:
+        atlas, rects = pack(faces, size)
+        file_name = f"atlas_{size_key(size)}.png"
+        pygame.image.save(atlas, os.path.join(out, "images", file_name))
+        index[size_key(size)] = {'file': file_name, 'rects': rects}
+    with open(os.path.join(out, "images", INDEX_FILE), "w") as f:
+        json.dump(index, f, sort_keys=True)
+    images = [f"images/{INDEX_FILE}"] + [f"images/{entry['file']}" for entry in index.values()]
+
+    files = {}
+    for path in images + list(sounds.values()):
+        with open(os.path.join(out, path), "rb") as f:
+            data = f.read()
+        files[path] = {'bytes': len(data), 'sha256': digest(data)}
+    source_bytes = sum(os.path.getsize(path) for path in glob.glob(os.path.join(sound_dir, "*.mp3")) +
+                       glob.glob(os.path.join(image_dir, "*.png")))
+    manifest = {'version': 1, 'images': images, 'sounds': sounds, 'files': files, 'source_bytes': source_bytes}
+    with open(os.path.join(out, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+async def fetch_url(url, timeout=30):
+    # The request blocks, so it runs on a worker thread while the frame loop keeps going
+    def read():
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read()
+    return await asyncio.to_thread(read)
+
+def browser_window():
+    # The page's JS window: pygbag exposes it as platform.window, Pyodide as the js module
+    return getattr(platform, 'window', None) or importlib.import_module('js')
+
+async def fetch_browser(url):
+    # The page's fetch(), awaited on the browser's event loop: there are no sockets for urllib
+    # and no threads for to_thread. Failures become OSError so AssetLoader retries them
+    try:
+        response = await browser_window().fetch(url)
+        if not response.ok:
+            raise OSError(f"HTTP {response.status} for {url}")
+        buffer = await response.arrayBuffer()
+    except OSError:
+        raise
+    except Exception as e:  # JS errors come through as the runtime's own exception type
+        raise OSError(f"Could not fetch {url}: {e}") from e
+    return buffer.to_bytes()
+
+def asset_url():
+    # Base URL of the bundle, or None when the game reads the local folders
+    if BROWSER:
+        return urllib.parse.urljoin(str(browser_window().location.href), BUNDLE_PATH)
+    return os.environ.get('TRUC_XANH_ASSET_URL')
+
+class AssetLoader:
+    def __init__(self, base_url, notes, cache_dir=None, fetch=None, on_images=None, on_error=None, connections=4,
+                 retries=3):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.notes = list(notes)
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.fetch = fetch or (fetch_browser if BROWSER else fetch_url)
+        self.on_images = on_images  # Called with the loader once the atlases are on disk
+        self.on_error = on_error  # Called with the loader if streaming fails for good
+        self.connections = connections
+        self.retries = retries
+        self.manifest = None
+        self.queue = []  # Manifest paths still to load, in order
+        self.loaded = set()
+        self.total_bytes = 0
+        self.loaded_bytes = 0
+        self.fetched_bytes = 0  # Loaded bytes that came over the network rather than from the cache
+        self.images_ready = False
+        self.done = False
+        self.error = None
+        self.start_time = time.perf_counter()
+        self.timings = {}  # Milestone -> ms since the loader was created
+        self.task = None
+
+    @property
+    def image_dir(self):
+        return os.path.join(self.cache_dir, "images")
+
+    @property
+    def sound_dir(self):
+        return os.path.join(self.cache_dir, "sounds")
+
+    @property
+    def sound_ext(self):
+        sounds = self.manifest['sounds'] if self.manifest else {}
+        return os.path.splitext(next(iter(sounds.values())))[1] if sounds else ".mp3"
+
+    def mark(self, milestone):
+        self.timings.setdefault(milestone, (time.perf_counter() - self.start_time) * 1000)
+
+    def start(self):
+        # Must be called with the asyncio loop running, e.g. from main()
+        self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+    async def run(self):
+        try:
+            self.manifest = json.loads(await self.get(MANIFEST))
+            self.mark('manifest')
+            sounds = self.manifest['sounds']
+            self.queue = list(self.manifest['images']) + [sounds[note] for note in self.notes if note in sounds]
+            self.total_bytes = sum(self.manifest['files'][path]['bytes'] for path in self.queue)
+            await asyncio.gather(*[self.worker() for _ in range(self.connections)])
+            self.done = True
+            self.mark('complete')
+        except (OSError, ValueError, KeyError) as e:
+            self.queue = []  # Stops the other workers
+            self.error = str(e)
+            print(f"Error loading assets from {self.base_url}: {e}")
+            if self.on_error:
+                self.on_error(self)
+
+    async def worker(self):
+        # Each worker takes the next path off the shared queue, so prioritize() applies right away
+        while self.queue:
+            await self.load(self.queue.pop(0))
+            if not self.images_ready and all(path in self.loaded for path in self.manifest['images']):
+                self.images_ready = True
+                self.mark('images')
+                if self.on_images:
+                    self.on_images(self)
+
+    async def get(self, path):
+        for attempt in range(self.retries):
+            try:
+                return await self.fetch(self.base_url + path)
+            except OSError:
+                if attempt == self.retries - 1:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def load(self, path):
+        entry = self.manifest['files'][path]
+        local_path = os.path.join(self.cache_dir, *path.split("/"))
+        try:
+            with open(local_path, "rb") as f:
+                cached = f.read()
+        except OSError:
+            cached = None
+        if cached is None or len(cached) != entry['bytes'] or digest(cached) != entry['sha256']:
+            data = await self.get(path)
+            if len(data) != entry['bytes'] or digest(data) != entry['sha256']:
+                raise ValueError(f"{path} does not match the manifest")
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            tmp_path = local_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, local_path)
+            self.fetched_bytes += len(data)
+        self.loaded.add(path)
+        self.loaded_bytes += entry['bytes']
+
+    def prioritize(self, notes):
+        # Fetch the sounds of these notes next, after the atlases
+        if not self.manifest:
+            self.notes = list(dict.fromkeys(list(notes) + self.notes))
+            return
+        wanted = [self.manifest['sounds'].get(note) for note in notes]
+        first = [path for path in self.queue if path in wanted or path in self.manifest['images']]
+        self.queue = first + [path for path in self.queue if path not in first]
+
+    def ready(self, notes):
+        if not self.images_ready:
+            return False
+        sounds = self.manifest['sounds']
+        return all(sounds[note] in self.loaded for note in notes if note in sounds)
+
+    def busy(self):
+        return not self.done and not self.error
+
+    def progress(self):
+        return self.loaded_bytes / self.total_bytes if self.total_bytes else 0.0
+
+    def stats(self):
+        return {'timings_ms': dict(self.timings), 'loaded_bytes': self.loaded_bytes,
+                'fetched_bytes': self.fetched_bytes, 'total_bytes': self.total_bytes, 'error': self.error}
+
+# Stand-in for the CDN: serves a bundle with a fixed delay per request and a
+# bandwidth cap per connection
+def serve_bundle(directory, latency_ms=0, kbps=0):
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def send_head(self):
+            time.sleep(latency_ms / 1000)
+            return super().send_head()
+
+        def copyfile(self, source, outputfile):
+            chunk = 16 * 1024
+            while True:
+                data = source.read(chunk)
+                if not data:
+                    break
+                outputfile.write(data)
+                if kbps:
+                    time.sleep(len(data) * 8 / (kbps * 1000))
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def time_to_interactive(module_name, bundle, latency_ms, kbps, think_ms, warm, fail=False, timeout=60):
+    # Runs the game headless against the throttled server: waits for the menu,
+    # picks two players and the first grid after `think_ms` and stops once the
+    # board is playable. Returns the milestones in ms since the loader started.
+    # With `fail` the loader is expected to fail, so it waits for the board anyway
+    server = serve_bundle(bundle, latency_ms, kbps)
+    cache = os.path.join(tempfile.gettempdir(), "truc_xanh_web_cache")
+    if not warm:
+        shutil.rmtree(cache, ignore_errors=True)
+    os.environ['TRUC_XANH_ASSET_CACHE'] = cache
+    os.environ['TRUC_XANH_ASSET_URL'] = f"http://127.0.0.1:{server.server_address[1]}/"
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    module = importlib.import_module(module_name)
+    loader, game = module.web_assets, module.game
+    loader.fetch = fetch_url  # Real sockets to the local server
+    result = {}
+
+    def drive():
+        while not module.startup.done:
+            time.sleep(0.001)
+        loader.mark('menu')
+        time.sleep(think_ms / 1000)
+        loader.mark('selected')
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_2))
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_3))
+        deadline = time.perf_counter() + timeout
+        while 'interactive' not in loader.timings and (fail or not loader.error) and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        result.update(loader.stats())
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+    threading.Thread(target=drive, daemon=True).start()
+    asyncio.run(module.main())
+    server.shutdown()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Web asset bundle for Truc Xanh Music")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help="transcode and pack the assets into a bundle")
+    build_parser.add_argument('--out', default="web")
+    build_parser.add_argument('--bitrate', default="64k", help="Vorbis bitrate when ffmpeg is available")
+    build_parser.add_argument('--channels', type=int, default=1)
+    tti_parser = commands.add_parser('tti', help="measure time to interactive against a local server")
+    tti_parser.add_argument('--module', choices=['main_2', 'main_5'], default='main_2')
+    tti_parser.add_argument('--bundle', default="web")
+    tti_parser.add_argument('--latency-ms', type=float, default=80)
+    tti_parser.add_argument('--kbps', type=float, default=1000, help="bandwidth per connection, 0 for unlimited")
+    tti_parser.add_argument('--think-ms', type=float, default=300, help="time the player spends in the menu")
+    tti_parser.add_argument('--warm', action='store_true', help="keep the local cache from the previous run")
+    tti_parser.add_argument('--fail', action='store_true',
+                            help="serve an empty bundle and check the game falls back to its packaged notes")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        pygame.display.init()
+        manifest = build(args.out, bitrate=args.bitrate, channels=args.channels)
+        bundle_bytes = sum(entry['bytes'] for entry in manifest['files'].values())
+        print(f"{len(manifest['sounds'])} sounds, {len(manifest['images'])} image files: "
+              f"{bundle_bytes / 1024:.0f} KiB (sources {manifest['source_bytes'] / 1024:.0f} KiB)")
+        return
+
+    if args.fail:
+        with tempfile.TemporaryDirectory() as empty:
+            result = time_to_interactive(args.module, empty, args.latency_ms, args.kbps, args.think_ms, False,
+                                         fail=True)
+        if not result.get('error') or 'interactive' not in result['timings_ms']:
+            sys.exit(f"FAIL the game did not fall back to its packaged notes: {result}")
+        print(f"OK interactive after {result['timings_ms']['interactive']:.1f} ms without a bundle "
+              f"({result['error']})")
+        return
+    if not os.path.exists(os.path.join(args.bundle, MANIFEST)):
+        sys.exit(f"No bundle in {args.bundle}: run `python web_assets.py build --out {args.bundle}` first")
+    result = time_to_interactive(args.module, os.path.abspath(args.bundle), args.latency_ms, args.kbps,
+                                 args.think_ms, args.warm)
+    if result.get('error'):
+        sys.exit(f"Loading failed: {result['error']}")
+    for milestone, ms in sorted(result['timings_ms'].items(), key=lambda item: item[1]):
+        print(f"  {milestone:<12} {ms:8.1f} ms")
+    print(f"  fetched {result['fetched_bytes'] / 1024:.0f} KiB of {result['total_bytes'] / 1024:.0f} KiB "
+          f"before the board was playable")
+
+if __name__ == "__main__":
+    main()